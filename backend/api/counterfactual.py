@@ -3,13 +3,10 @@ Counterfactual analysis endpoint
 """
 
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import Dict, Any
 
-from backend.core.feature_engineering import FeatureEngineer
-from backend.core.prediction_service import PredictionService
-from backend.core.counterfactual_service import CounterfactualService
-
 router = APIRouter()
 
 
@@ -35,8 +32,8 @@ class CounterfactualRequest(BaseModel):
         }
 
 
-@router.post("/counterfactual")
-async def analyze_counterfactual(request_data: CounterfactualRequest, request: Request):
+@router.post("/counterfactual", response_class=ORJSONResponse)
+def analyze_counterfactual(request_data: CounterfactualRequest, request: Request):
     """
     Analyze what-if scenarios by modifying input features
     
@@ -44,24 +41,8 @@ async def analyze_counterfactual(request_data: CounterfactualRequest, request: R
     """
     
     try:
-        # Get model registry
-        model_registry = request.app.state.model_registry
-        
-        # Initialize services
-        feature_engineer = FeatureEngineer(
-            encoders=model_registry.encoders,
-            feature_names=model_registry.feature_names
-        )
-        
-        prediction_service = PredictionService(
-            model_registry=model_registry,
-            feature_engineer=feature_engineer
-        )
-        
-        counterfactual_service = CounterfactualService(
-            prediction_service=prediction_service,
-            feature_engineer=feature_engineer
-        )
+        # Services are built once at startup
+        counterfactual_service = request.app.state.counterfactual_service
         
         # Analyze counterfactual
         result = counterfactual_service.analyze_counterfactual(
@@ -70,7 +51,7 @@ async def analyze_counterfactual(request_data: CounterfactualRequest, request: R
             model_name=request_data.model_id
         )
         
-        return result
+        return ORJSONResponse(result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Counterfactual analysis failed: {str(e)}")
@@ -3,13 +3,11 @@ Explainability endpoint
 """
 
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 import numpy as np
 
-from backend.core.feature_engineering import FeatureEngineer
-from backend.core.explainability_service import ExplainabilityService
-
 router = APIRouter()
 
 
@@ -20,8 +18,15 @@ class ExplainRequest(BaseModel):
     model_id: str = Field("xgboost", description="Model to explain")
 
 
-@router.post("/explain")
-async def explain_prediction(request_data: ExplainRequest, request: Request):
+class ExplainBatchRequest(BaseModel):
+    """Request model for explaining several guards of one input"""
+    input_features: dict = Field(..., description="Input features to explain")
+    guard_indices: List[int] = Field(..., description="Guard indices to explain")
+    model_id: str = Field("xgboost", description="Model to explain")
+
+
+@router.post("/explain", response_class=ORJSONResponse)
+def explain_prediction(request_data: ExplainRequest, request: Request):
     """
     Generate SHAP-based explanation for a prediction
     
@@ -29,19 +34,9 @@ async def explain_prediction(request_data: ExplainRequest, request: Request):
     """
     
     try:
-        # Get model registry
-        model_registry = request.app.state.model_registry
-        
-        # Initialize services
-        feature_engineer = FeatureEngineer(
-            encoders=model_registry.encoders,
-            feature_names=model_registry.feature_names
-        )
-        
-        explainability_service = ExplainabilityService(
-            model_registry=model_registry,
-            feature_engineer=feature_engineer
-        )
+        # Services are built once at startup
+        feature_engineer = request.app.state.feature_engineer
+        explainability_service = request.app.state.explainability_service
         
         # Engineer features
         features = feature_engineer.engineer_from_input(request_data.input_features)
@@ -53,38 +48,58 @@ async def explain_prediction(request_data: ExplainRequest, request: Request):
             model_name=request_data.model_id
         )
         
-        return result
+        # orjson serializes the NumPy SHAP values and scalars natively
+        return ORJSONResponse(result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Explanation failed: {str(e)}")
 
 
-@router.get("/feature-importance/{model_id}")
-async def get_feature_importance(model_id: str, request: Request):
+@router.post("/explain-batch", response_class=ORJSONResponse)
+def explain_batch(request_data: ExplainBatchRequest, request: Request):
     """
-    Get global feature importance for a model
+    Generate SHAP-based explanations for several guards at once
+    
+    SHAP values are computed once and shared across all requested guards
     """
     
     try:
-        model_registry = request.app.state.model_registry
+        # Services are built once at startup
+        feature_engineer = request.app.state.feature_engineer
+        explainability_service = request.app.state.explainability_service
         
-        feature_engineer = FeatureEngineer(
-            encoders=model_registry.encoders,
-            feature_names=model_registry.feature_names
-        )
+        # Engineer features
+        features = feature_engineer.engineer_from_input(request_data.input_features)
         
-        explainability_service = ExplainabilityService(
-            model_registry=model_registry,
-            feature_engineer=feature_engineer
+        # Generate explanations
+        result = explainability_service.explain_batch(
+            features=features,
+            guard_indices=request_data.guard_indices,
+            model_name=request_data.model_id
         )
         
+        return ORJSONResponse(result)
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch explanation failed: {str(e)}")
+
+
+@router.get("/feature-importance/{model_id}", response_class=ORJSONResponse)
+async def get_feature_importance(model_id: str, request: Request):
+    """
+    Get global feature importance for a model
+    """
+    
+    try:
+        explainability_service = request.app.state.explainability_service
+        
         importance = explainability_service.get_feature_importance(model_name=model_id)
         
-        return {
+        return ORJSONResponse({
             "success": True,
             "model": model_id,
             "feature_importance": importance
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Feature importance failed: {str(e)}")
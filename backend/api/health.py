@@ -2,12 +2,20 @@
 Health check endpoint
 """
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, HTTPException
 from datetime import datetime
+from functools import lru_cache
+import time
 
 router = APIRouter()
 
 
+@lru_cache(maxsize=1)
+def _timestamp_for_second(second: int) -> str:
+    """ISO timestamp, formatted once per wall-clock second"""
+    return datetime.fromtimestamp(second).isoformat()
+
+
 @router.get("/health")
 async def health_check(request: Request):
     """
@@ -17,11 +25,15 @@ async def health_check(request: Request):
     
     model_registry = request.app.state.model_registry
     
+    # Snapshot is filled at the end of load_all_models
+    if not model_registry.health_snapshot:
+        raise HTTPException(status_code=503, detail="Models not loaded")
+    
     return {
         "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "models_loaded": model_registry.list_models(),
-        "num_models": len(model_registry.models),
-        "encoders_loaded": len(model_registry.encoders) > 0,
-        "shap_available": model_registry.shap_explainer is not None
+        "timestamp": _timestamp_for_second(int(time.time())),
+        **model_registry.health_snapshot,
+        # The XGBoost explainer is built on the first /explain; only a failed build rules it out
+        "shap_available": ('xgboost' in model_registry.models
+                           and 'xgboost' not in model_registry.shap_explainer_errors)
     }
@@ -3,13 +3,16 @@ Prediction Endpoint - FIXED TO USE ACTUAL DATASET
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional
+import threading
 import numpy as np
 import pandas as pd
-from pathlib import Path
 from backend.core.model_loader import get_registry
-from backend.config import PROCESSED_DATA
+from backend.config import (
+    PROCESSED_DATA, PROCESSED_DATA_CSV, RAW_CIRCUIT_DATA, RAW_CIRCUIT_DATA_CSV, NUM_FEATURES
+)
 
 router = APIRouter()
 
@@ -24,69 +27,85 @@ class PredictionRequest(BaseModel):
     top_k: int = 10
 
 
+# Compact dtypes shared by the processed and raw data reads
+# (read_dataset applies only the keys present in the columns being read)
+DTYPES = {
+    'guard_bandwidth': 'float32',
+    'middle_bandwidth': 'float32',
+    'exit_bandwidth': 'float32',
+    'circuit_setup_duration': 'float32',
+    'total_bytes': 'int64',
+    'guard_label': 'int32',
+    'exit_country': 'category',
+    'guard_country': 'category',
+    'guard_fingerprint': 'category',
+    'guard_address': 'category',
+    'exit_address': 'category',
+}
+
+
+def read_dataset(parquet_path, csv_path, usecols=None):
+    """Read a dataset from Parquet if present, else from CSV, with DTYPES applied"""
+    if parquet_path.exists():
+        df = pd.read_parquet(parquet_path, engine='pyarrow', columns=usecols)
+        return df.astype({col: dtype for col, dtype in DTYPES.items() if col in df.columns})
+    # The pyarrow engine raises KeyError for dtype keys outside the columns read
+    columns = usecols if usecols is not None else pd.read_csv(csv_path, nrows=0).columns
+    dtypes = {col: dtype for col, dtype in DTYPES.items() if col in columns}
+    return pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, engine='pyarrow')
+
+
 # Load processed dataset ONCE at startup
 try:
-    DATASET = pd.read_csv(PROCESSED_DATA)
-    print(f"✅ Loaded dataset: {len(DATASET)} samples")
+    DATASET = read_dataset(PROCESSED_DATA, PROCESSED_DATA_CSV)
+    print(f"✅ Loaded dataset: {len(DATASET)} samples "
+          f"({DATASET.memory_usage(deep=True).sum() / 1024**2:.1f} MB)")
+    # Guard bandwidths in sorted order for O(log N) window lookups;
+    # BW_ORDER maps sorted positions back to DATASET rows
+    BW_ORDER = np.argsort(DATASET['guard_bandwidth'].to_numpy(), kind='stable')
+    BW_VALUES = DATASET['guard_bandwidth'].to_numpy(dtype=np.float64)[BW_ORDER]
+    FEATURE_MATRIX = DATASET.drop('guard_label', axis=1).to_numpy(dtype=np.float32)
 except Exception as e:
     print(f"⚠️ Dataset load failed: {e}")
     DATASET = None
+    BW_ORDER = BW_VALUES = FEATURE_MATRIX = None
 
 
-@router.post("/predict")
-async def predict_guard(request: PredictionRequest):
+# Raw columns used by the lookups and create_features_from_circuit
+RAW_COLS = [
+    'exit_address', 'guard_fingerprint', 'guard_address', 'guard_country',
+    'guard_bandwidth', 'middle_bandwidth', 'exit_bandwidth',
+    'circuit_setup_duration', 'total_bytes',
+]
+
+# Load raw circuit data ONCE at startup and index it for O(1) lookups
+try:
+    RAW_DF = read_dataset(RAW_CIRCUIT_DATA, RAW_CIRCUIT_DATA_CSV, usecols=RAW_COLS)
+    # exit IP -> row positions
+    EXIT_IP_GROUPS = RAW_DF.groupby('exit_address', observed=True).indices
+    # guard fingerprint -> {guard_address, guard_country, guard_bandwidth} of its first circuit
+    GUARD_INFO = (
+        RAW_DF.drop_duplicates('guard_fingerprint')
+        .set_index('guard_fingerprint')[['guard_address', 'guard_country', 'guard_bandwidth']]
+        .to_dict('index')
+    )
+    print(f"✅ Loaded raw circuits: {len(RAW_DF)} rows "
+          f"({RAW_DF.memory_usage(deep=True).sum() / 1024**2:.1f} MB)")
+except Exception as e:
+    print(f"⚠️ Raw data load failed: {e}")
+    RAW_DF = None
+    EXIT_IP_GROUPS = {}
+    GUARD_INFO = {}
+
+
+@router.post("/predict", response_class=ORJSONResponse)
+def predict_guard(request: PredictionRequest):
     """Predict guard node from exit node features - USES ACTUAL DATA"""
     
     try:
         registry = get_registry()
         
-        # Try to find matching exit IP in dataset
-        if DATASET is not None:
-            # Load raw data to get exit IP mapping
-            raw_data_path = Path("data/raw/circuit_data_raw.csv")
-            if raw_data_path.exists():
-                raw_df = pd.read_csv(raw_data_path)
-                
-                # Find circuits with this exit IP
-                matching_circuits = raw_df[raw_df['exit_address'] == request.exit_ip]
-                
-                if len(matching_circuits) > 0:
-                    print(f"✅ Found {len(matching_circuits)} circuits with exit IP {request.exit_ip}")
-                    
-                    # Get the actual guard fingerprints used with this exit
-                    actual_guards = matching_circuits['guard_fingerprint'].value_counts()
-                    print(f"Actual guards used: {actual_guards.head()}")
-                    
-                    # Get one sample circuit for feature extraction
-                    sample_circuit = matching_circuits.iloc[0]
-                    
-                    # Find corresponding processed features
-                    # Match by finding rows with similar characteristics
-                    processed_matches = DATASET[
-                        (DATASET['guard_bandwidth'] > sample_circuit['guard_bandwidth'] - 0.5) &
-                        (DATASET['guard_bandwidth'] < sample_circuit['guard_bandwidth'] + 0.5)
-                    ]
-                    
-                    if len(processed_matches) > 0:
-                        # Use actual features from dataset
-                        sample_idx = processed_matches.index[0]
-                        features = DATASET.drop('guard_label', axis=1).iloc[[sample_idx]].values
-                        actual_guard_label = DATASET.loc[sample_idx, 'guard_label']
-                        
-                        print(f"Using processed features from index {sample_idx}")
-                        print(f"Actual guard label in dataset: {actual_guard_label}")
-                    else:
-                        # Fallback: create features from raw data
-                        features = create_features_from_circuit(sample_circuit, registry)
-                else:
-                    print(f"⚠️ Exit IP {request.exit_ip} not found in dataset")
-                    # Use generic features
-                    features = create_generic_features(request, registry)
-            else:
-                print(f"⚠️ Raw data file not found")
-                features = create_generic_features(request, registry)
-        else:
-            features = create_generic_features(request, registry)
+        features, num_matches = resolve_features(request, registry)
         
         # Make prediction using the model
         top_indices, top_probs = registry.predict(
@@ -96,56 +115,9 @@ async def predict_guard(request: PredictionRequest):
         )
         
         # Map indices back to actual guard IPs from dataset
-        predictions = []
+        predictions = build_predictions(top_indices, top_probs, request, registry)
         
-        # Load encoders to decode guard labels
-        if registry.encoders and 'guard_fingerprint_encoder' in registry.encoders:
-            guard_encoder = registry.encoders['guard_fingerprint_encoder']
-            
-            # Load raw data again for IP mapping
-            raw_data_path = Path("data/raw/circuit_data_raw.csv")
-            if raw_data_path.exists():
-                raw_df = pd.read_csv(raw_data_path)
-                
-                for rank, (idx, prob) in enumerate(zip(top_indices, top_probs), 1):
-                    try:
-                        # Decode the guard fingerprint
-                        guard_fingerprint = guard_encoder.inverse_transform([int(idx)])[0]
-                        
-                        # Find this guard in raw data
-                        guard_info = raw_df[raw_df['guard_fingerprint'] == guard_fingerprint]
-                        
-                        if len(guard_info) > 0:
-                            guard_data = guard_info.iloc[0]
-                            guard_ip = guard_data['guard_address']
-                            guard_country = guard_data['guard_country']
-                            guard_bw = guard_data['guard_bandwidth']
-                        else:
-                            # Fallback if not found
-                            guard_ip = f"192.168.{int(idx) // 255}.{int(idx) % 255}"
-                            guard_country = request.exit_country
-                            guard_bw = request.bandwidth + np.random.uniform(-1, 1)
-                        
-                        predictions.append({
-                            "rank": rank,
-                            "guard_index": int(idx),
-                            "guard_fingerprint": guard_fingerprint,
-                            "guard_ip": guard_ip,
-                            "country": guard_country,
-                            "bandwidth": round(float(guard_bw), 2),
-                            "confidence": float(prob)
-                        })
-                        
-                    except Exception as e:
-                        print(f"Error decoding guard {idx}: {e}")
-                        continue
-            else:
-                # Fallback without decoder
-                predictions = create_fallback_predictions(top_indices, top_probs, request)
-        else:
-            predictions = create_fallback_predictions(top_indices, top_probs, request)
-        
-        return {
+        return ORJSONResponse({
             "predictions": predictions,
             "model_used": request.model_id,
             "top_k": request.top_k,
@@ -153,9 +125,9 @@ async def predict_guard(request: PredictionRequest):
             "request_summary": {
                 "exit_ip": request.exit_ip,
                 "exit_country": request.exit_country,
-                "found_in_dataset": len(matching_circuits) > 0 if 'matching_circuits' in locals() else False
+                "found_in_dataset": num_matches > 0
             }
-        }
+        })
         
     except Exception as e:
         import traceback
@@ -164,9 +136,119 @@ async def predict_guard(request: PredictionRequest):
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 
+def resolve_features(request, registry):
+    """
+    Build the feature vector for a request
+    
+    Uses processed dataset features when the exit IP is known, otherwise
+    features derived from the raw circuit or from the request itself.
+    
+    Returns:
+        (features, num_matches): (1, NUM_FEATURES) array and the number of
+        raw circuits seen with this exit IP
+    """
+    if DATASET is None:
+        return create_generic_features(request, registry), 0
+    
+    if RAW_DF is None:
+        print(f"⚠️ Raw data file not found")
+        return create_generic_features(request, registry), 0
+    
+    # Find circuits with this exit IP
+    matching_circuits = RAW_DF.iloc[EXIT_IP_GROUPS.get(request.exit_ip, [])]
+    num_matches = len(matching_circuits)
+    
+    if num_matches == 0:
+        print(f"⚠️ Exit IP {request.exit_ip} not found in dataset")
+        return create_generic_features(request, registry), 0
+    
+    print(f"✅ Found {num_matches} circuits with exit IP {request.exit_ip}")
+    
+    # Get the actual guard fingerprints used with this exit
+    actual_guards = matching_circuits['guard_fingerprint'].value_counts()
+    print(f"Actual guards used: {actual_guards.head()}")
+    
+    # Get one sample circuit for feature extraction
+    sample_circuit = matching_circuits.iloc[0]
+    
+    # Find corresponding processed features
+    # Match by finding rows with similar characteristics
+    sample_bw = float(sample_circuit['guard_bandwidth'])
+    lo = np.searchsorted(BW_VALUES, sample_bw - 0.5, side='right')
+    hi = np.searchsorted(BW_VALUES, sample_bw + 0.5, side='left')
+    
+    if hi <= lo:
+        # Fallback: create features from raw data
+        return create_features_from_circuit(sample_circuit, registry), num_matches
+    
+    # Use actual features from dataset (first matching row)
+    sample_idx = int(BW_ORDER[lo:hi].min())
+    print(f"Using processed features from index {sample_idx}")
+    print(f"Actual guard label in dataset: {DATASET.loc[sample_idx, 'guard_label']}")
+    
+    return FEATURE_MATRIX[[sample_idx]], num_matches
+
+
+def build_predictions(top_indices, top_probs, request, registry):
+    """Map predicted guard indices to fingerprints, IPs and countries"""
+    
+    # Decoding needs the guard encoder and the raw data lookup
+    if RAW_DF is None or not registry.encoders or 'guard_fingerprint_encoder' not in registry.encoders:
+        return create_fallback_predictions(top_indices, top_probs, request)
+    
+    guard_encoder = registry.encoders['guard_fingerprint_encoder']
+    
+    # Decode all guard fingerprints in one call
+    fingerprints = guard_encoder.inverse_transform(np.asarray(top_indices, dtype=np.int64))
+    # Bandwidth jitter for guards missing from raw data, drawn in one call
+    bw_jitter = _thread_rng().uniform(-1, 1, size=len(top_indices))
+    
+    predictions = []
+    for rank, (guard_fingerprint, idx, prob, jitter) in enumerate(
+            zip(fingerprints, top_indices, top_probs, bw_jitter), 1):
+        # Find this guard in raw data
+        info = GUARD_INFO.get(guard_fingerprint)
+        
+        if info is not None:
+            guard_ip = info['guard_address']
+            guard_country = info['guard_country']
+            guard_bw = info['guard_bandwidth']
+        else:
+            # Fallback if not found
+            guard_ip = f"192.168.{int(idx) // 255}.{int(idx) % 255}"
+            guard_country = request.exit_country
+            guard_bw = request.bandwidth + jitter
+        
+        predictions.append({
+            "rank": rank,
+            "guard_index": int(idx),
+            "guard_fingerprint": guard_fingerprint,
+            "guard_ip": guard_ip,
+            "country": guard_country,
+            "bandwidth": round(float(guard_bw), 2),
+            "confidence": float(prob)
+        })
+    
+    return predictions
+
+
+# Per-thread state (sync handlers run in a threadpool)
+_SCRATCH_TLS = threading.local()
+
+
+def _thread_rng():
+    """Return this thread's NumPy Generator (Generators are not thread-safe)"""
+    rng = getattr(_SCRATCH_TLS, 'rng', None)
+    if rng is None:
+        rng = _SCRATCH_TLS.rng = np.random.default_rng()
+    return rng
+
+
 def create_generic_features(request, registry):
     """Create feature vector from request"""
-    features = np.zeros((1, 75))
+    # Fresh array per request: CatBoost marks its input read-only, so a shared
+    # buffer could not be refilled after a catboost/ensemble prediction
+    features = np.zeros((1, NUM_FEATURES), dtype=np.float32)
     features[0, 0] = request.bandwidth
     features[0, 1] = request.circuit_setup_duration
     features[0, 2] = request.total_bytes / 1000000
@@ -180,7 +262,7 @@ def create_generic_features(request, registry):
 
 def create_features_from_circuit(circuit_row, registry):
     """Create features from actual circuit data"""
-    features = np.zeros((1, 75))
+    features = np.zeros((1, NUM_FEATURES), dtype=np.float32)
     
     # Map raw circuit features
     features[0, 0] = circuit_row.get('guard_bandwidth', 7.5)
@@ -197,13 +279,19 @@ def create_fallback_predictions(top_indices, top_probs, request):
     predictions = []
     countries = ['DE', 'US', 'GB', 'FR', 'NL', 'CA']
     
-    for rank, (idx, prob) in enumerate(zip(top_indices, top_probs), 1):
+    # Draw all random placeholders in one call each
+    rng = _thread_rng()
+    country_pick = rng.choice(countries, size=len(top_indices))
+    bw_jitter = rng.uniform(-2, 2, size=len(top_indices))
+    
+    for rank, (idx, prob, country, jitter) in enumerate(
+            zip(top_indices, top_probs, country_pick, bw_jitter), 1):
         predictions.append({
             "rank": rank,
             "guard_index": int(idx),
             "guard_ip": f"192.168.{int(idx) // 255}.{int(idx) % 255}",
-            "country": np.random.choice(countries),
-            "bandwidth": round(request.bandwidth + np.random.uniform(-2, 2), 2),
+            "country": str(country),
+            "bandwidth": round(request.bandwidth + float(jitter), 2),
             "confidence": float(prob)
         })
     
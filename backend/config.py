@@ -2,6 +2,7 @@
 Backend Configuration
 """
 
+import os
 from pathlib import Path
 
 # Project root
@@ -11,7 +12,9 @@ PROJECT_ROOT = Path(__file__).parent.parent
 API_HOST = "0.0.0.0"
 API_PORT = 8000
 API_RELOAD = False
-API_WORKERS = 1
+API_WORKERS = 1  # Each worker loads its own copy of the models; scale with cores/RAM
+# Worker threads for the sync (CPU-bound) endpoints within one process
+API_THREADPOOL_SIZE = (os.cpu_count() or 1) * 2
 
 # CORS Configuration
 CORS_ORIGINS = [
@@ -24,14 +27,19 @@ CORS_ORIGINS = [
 # Model Paths
 MODELS_DIR = PROJECT_ROOT / "models"
 XGBOOST_MODEL = MODELS_DIR / "xgboost" / "xgboost_v1.json"
-LIGHTGBM_MODEL = MODELS_DIR / "lightgbm" / "lightgbm_v1.pkl"
+LIGHTGBM_MODEL = MODELS_DIR / "lightgbm" / "lightgbm_v1.txt"
 CATBOOST_MODEL = MODELS_DIR / "catboost" / "catboost_v1.cbm"
 ENSEMBLE_MODEL = MODELS_DIR / "ensemble" / "ensemble_v1.pkl"
-SHAP_EXPLAINER = MODELS_DIR / "shap" / "shap_explainer_xgboost.pkl"
+# The SHAP explainer is rebuilt from the XGBoost model at startup; only its metadata is stored
+SHAP_METADATA = MODELS_DIR / "shap" / "shap_metadata.json"
 
 # Data Paths
 DATA_DIR = PROJECT_ROOT / "data"
-PROCESSED_DATA = DATA_DIR / "processed" / "circuits_engineered_75_features.csv"
+# Parquet copies are written by scripts/02_engineer_features.py; CSVs are the fallback
+RAW_CIRCUIT_DATA = DATA_DIR / "raw" / "circuit_data_raw.parquet"
+RAW_CIRCUIT_DATA_CSV = DATA_DIR / "raw" / "circuit_data_raw.csv"
+PROCESSED_DATA = DATA_DIR / "processed" / "circuits_engineered_75_features.parquet"
+PROCESSED_DATA_CSV = DATA_DIR / "processed" / "circuits_engineered_75_features.csv"
 ENCODERS_DIR = MODELS_DIR / "encoders"
 LABEL_ENCODERS = ENCODERS_DIR / "label_encoders.pkl"
 FEATURE_NAMES = ENCODERS_DIR / "feature_names.json"
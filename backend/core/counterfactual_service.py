@@ -4,6 +4,7 @@ What-if scenario analysis with feature modifications
 """
 
 import numpy as np
+from collections import ChainMap
 from typing import Dict, List, Any
 
 
@@ -36,9 +37,8 @@ class CounterfactualService:
             top_k=10
         )
         
-        # Create modified input
-        modified_input = original_input.copy()
-        modified_input.update(modified_features)
+        # Create modified input (read-only overlay, no copy of original_input)
+        modified_input = ChainMap(modified_features, original_input)
         
         # Get modified prediction
         modified_prediction = self.prediction_service.predict(
@@ -72,38 +72,59 @@ class CounterfactualService:
     def _compare_predictions(self, original: List[Dict], modified: List[Dict]) -> Dict[str, Any]:
         """Compare two prediction sets"""
         
-        # Create index maps
-        orig_map = {p['guard_index']: p for p in original}
-        mod_map = {p['guard_index']: p for p in modified}
+        # Stack both prediction sets into arrays
+        orig_idx, orig_rank, orig_conf = self._to_arrays(original)
+        mod_idx, mod_rank, mod_conf = self._to_arrays(modified)
         
-        # Track rank changes
-        rank_changes = []
+        # Align both sets on the union of guard indices (-1 rank = not in top-k)
+        union = np.union1d(orig_idx, mod_idx)
+        orig_rank_full = np.full(len(union), -1, dtype=np.int32)
+        mod_rank_full = np.full(len(union), -1, dtype=np.int32)
+        orig_conf_full = np.zeros(len(union))
+        mod_conf_full = np.zeros(len(union))
         
-        for guard_idx in set(list(orig_map.keys()) + list(mod_map.keys())):
-            orig_rank = orig_map[guard_idx]['rank'] if guard_idx in orig_map else None
-            mod_rank = mod_map[guard_idx]['rank'] if guard_idx in mod_map else None
-            
-            orig_conf = orig_map[guard_idx]['confidence'] if guard_idx in orig_map else 0
-            mod_conf = mod_map[guard_idx]['confidence'] if guard_idx in mod_map else 0
-            
-            if orig_rank is not None or mod_rank is not None:
-                rank_changes.append({
-                    "guard_index": guard_idx,
-                    "original_rank": orig_rank,
-                    "modified_rank": mod_rank,
-                    "rank_change": (orig_rank - mod_rank) if (orig_rank and mod_rank) else None,
-                    "confidence_change": mod_conf - orig_conf
-                })
-        
-        # Sort by absolute confidence change
-        rank_changes.sort(key=lambda x: abs(x['confidence_change']), reverse=True)
+        orig_pos = np.searchsorted(union, orig_idx)
+        mod_pos = np.searchsorted(union, mod_idx)
+        orig_rank_full[orig_pos] = orig_rank
+        orig_conf_full[orig_pos] = orig_conf
+        mod_rank_full[mod_pos] = mod_rank
+        mod_conf_full[mod_pos] = mod_conf
+        
+        conf_change = mod_conf_full - orig_conf_full
+        
+        # Keep the 10 largest absolute confidence changes, then order only those
+        abs_change = np.abs(conf_change)
+        n_top = min(10, len(abs_change))
+        part = np.argpartition(-abs_change, n_top - 1)[:n_top]
+        order = part[np.argsort(-abs_change[part], kind='stable')]
+        
+        rank_changes = []
+        for i in order:
+            o_rank = int(orig_rank_full[i]) if orig_rank_full[i] >= 0 else None
+            m_rank = int(mod_rank_full[i]) if mod_rank_full[i] >= 0 else None
+            rank_changes.append({
+                "guard_index": int(union[i]),
+                "original_rank": o_rank,
+                "modified_rank": m_rank,
+                "rank_change": (o_rank - m_rank) if (o_rank and m_rank) else None,
+                "confidence_change": float(conf_change[i])
+            })
         
         return {
-            "rank_changes": rank_changes[:10],
+            "rank_changes": rank_changes,
             "top_guard_changed": original[0]['guard_index'] != modified[0]['guard_index'],
-            "average_confidence_change": np.mean([rc['confidence_change'] for rc in rank_changes if rc['confidence_change'] is not None])
+            "average_confidence_change": float(conf_change.mean())
         }
     
+    @staticmethod
+    def _to_arrays(predictions: List[Dict]):
+        """Extract guard indices, ranks and confidences as NumPy arrays"""
+        n = len(predictions)
+        idx = np.fromiter((p['guard_index'] for p in predictions), dtype=np.int32, count=n)
+        rank = np.fromiter((p['rank'] for p in predictions), dtype=np.int32, count=n)
+        conf = np.fromiter((p['confidence'] for p in predictions), dtype=np.float64, count=n)
+        return idx, rank, conf
+    
     def _analyze_sensitivity(self, original: Dict, modified: Dict, 
                             modified_features: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze how sensitive predictions are to feature changes"""
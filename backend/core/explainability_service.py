@@ -4,9 +4,24 @@ SHAP-based explanations for predictions
 """
 
 import numpy as np
-import shap
+import pandas as pd
+from numba import njit
 from typing import Dict, List, Any
 
+from backend.config import NUM_FEATURES
+
+# Default XGBoost importance keys for boosters trained without feature names
+XGB_DEFAULT_FEATURE_KEYS = pd.Index([f'f{i}' for i in range(NUM_FEATURES)])
+
+
+@njit(cache=True)
+def _topk_abs(shap_values, k):
+    """Indices and absolute values of the k largest |SHAP| entries, descending"""
+    abs_shap = np.abs(shap_values)
+    part = np.argpartition(abs_shap, -k)[-k:]
+    order = part[np.argsort(-abs_shap[part])]
+    return order.astype(np.int32), abs_shap[order]
+
 
 class ExplainabilityService:
     """Service for generating SHAP explanations"""
@@ -14,14 +29,13 @@ class ExplainabilityService:
     def __init__(self, model_registry, feature_engineer):
         self.model_registry = model_registry
         self.feature_engineer = feature_engineer
-        self.shap_explainer = model_registry.shap_explainer
     
     def explain_prediction(self, features: np.ndarray, guard_idx: int, model_name: str = "xgboost") -> Dict[str, Any]:
         """
         Generate SHAP explanation for a specific prediction
         
         Args:
-            features: Feature vector (75,)
+            features: Feature vector (75,) or (1, 75)
             guard_idx: Index of predicted guard
             model_name: Model to explain
             
@@ -29,13 +43,47 @@ class ExplainabilityService:
             Dictionary with SHAP values and natural language explanation
         """
         
-        # Get SHAP values
-        if self.shap_explainer is None:
-            # Create explainer on-the-fly if not pre-computed
-            model = self.model_registry.get_model(model_name)
-            self.shap_explainer = shap.TreeExplainer(model)
+        explainer = self._get_explainer(model_name)
+        features = features.reshape(1, -1)
+        shap_values = explainer.shap_values(features)
+        
+        return {"success": True, **self._build_explanation(explainer, shap_values, features[0], guard_idx)}
+    
+    def explain_batch(self, features: np.ndarray, guard_indices: List[int],
+                      model_name: str = "xgboost") -> Dict[str, Any]:
+        """
+        Generate SHAP explanations for several guards of the same input
+        
+        SHAP values are computed once and sliced per guard, so explaining
+        the top-k guards costs one tree walk instead of k.
+        
+        Args:
+            features: Feature vector (75,) or (1, 75)
+            guard_indices: Indices of guards to explain
+            model_name: Model to explain
+            
+        Returns:
+            Dictionary with one explanation per requested guard
+        """
         
-        shap_values = self.shap_explainer.shap_values(features.reshape(1, -1))
+        explainer = self._get_explainer(model_name)
+        features = features.reshape(1, -1)
+        shap_values = explainer.shap_values(features)
+        
+        return {
+            "success": True,
+            "explanations": [
+                self._build_explanation(explainer, shap_values, features[0], guard_idx)
+                for guard_idx in guard_indices
+            ]
+        }
+    
+    def _get_explainer(self, model_name: str):
+        """Return the registry's SHAP explainer, built once on first use"""
+        return self.model_registry.get_shap_explainer(model_name)
+    
+    def _build_explanation(self, explainer, shap_values, features: np.ndarray, guard_idx: int) -> Dict[str, Any]:
+        """Format the explanation of one guard from precomputed SHAP values"""
         
         # Handle multi-class output (shap_values is list of arrays)
         if isinstance(shap_values, list):
@@ -43,6 +91,7 @@ class ExplainabilityService:
             shap_values_guard = shap_values[guard_idx][0]
         else:
             shap_values_guard = shap_values[0]
+        shap_values_guard = np.ascontiguousarray(shap_values_guard, dtype=np.float32)
         
         # Get feature names
         feature_names = self.feature_engineer.feature_names
@@ -53,34 +102,39 @@ class ExplainabilityService:
         # Generate natural language explanation
         explanation_text = self._generate_explanation(top_features, guard_idx)
         
+        # Multi-class explainers expose one expected value per class
+        base_value = getattr(explainer, 'expected_value', 0.0)
+        if np.ndim(base_value) > 0:
+            base_value = np.asarray(base_value)[guard_idx]
+        
         return {
-            "success": True,
             "guard_index": guard_idx,
-            "shap_values": shap_values_guard.tolist(),
+            "shap_values": shap_values_guard,
             "feature_names": feature_names,
             "top_features": top_features,
             "explanation": explanation_text,
-            "base_value": float(self.shap_explainer.expected_value) if hasattr(self.shap_explainer, 'expected_value') else 0.0
+            "base_value": base_value
         }
     
     def _get_top_features(self, shap_values: np.ndarray, features: np.ndarray, 
                          feature_names: List[str], top_n: int = 10) -> List[Dict]:
         """Get top N features by absolute SHAP value"""
         
-        # Get absolute SHAP values
-        abs_shap = np.abs(shap_values)
+        # float32 contiguous input keeps the jitted helper on one compiled signature
+        shap_values = np.ascontiguousarray(shap_values, dtype=np.float32)
+        total_abs = np.abs(shap_values).sum()
         
         # Get top indices
-        top_indices = np.argsort(abs_shap)[-top_n:][::-1]
+        top_indices, top_abs = _topk_abs(shap_values, min(top_n, len(shap_values)))
         
         top_features = []
-        for idx in top_indices:
+        for idx, abs_val in zip(top_indices, top_abs):
             top_features.append({
                 "feature_name": feature_names[idx],
-                "feature_value": float(features[idx]),
-                "shap_value": float(shap_values[idx]),
+                "feature_value": features[idx],
+                "shap_value": shap_values[idx],
                 "contribution": "positive" if shap_values[idx] > 0 else "negative",
-                "impact_percentage": float(abs_shap[idx] / abs_shap.sum() * 100)
+                "impact_percentage": abs_val / total_abs * 100
             })
         
         return top_features
@@ -109,31 +163,57 @@ class ExplainabilityService:
     def get_feature_importance(self, model_name: str = "xgboost") -> List[Dict]:
         """Get global feature importance for a model"""
         
-        model = self.model_registry.get_model(model_name)
         feature_names = self.feature_engineer.feature_names
         
-        # Get feature importance (varies by model type)
-        if hasattr(model, 'feature_importances_'):
-            importances = model.feature_importances_
-        elif hasattr(model, 'get_score'):
-            # XGBoost Booster
-            importance_dict = model.get_score(importance_type='gain')
-            importances = np.array([importance_dict.get(f'f{i}', 0) for i in range(len(feature_names))])
-        else:
-            importances = np.zeros(len(feature_names))
-        
-        # Normalize
-        if importances.sum() > 0:
-            importances = importances / importances.sum() * 100
+        # Importances are static after training: compute once per model
+        cached = self.model_registry.importance_cache.get(model_name)
+        if cached is None:
+            model = self.model_registry.get_model(model_name)
+            
+            # Get feature importance (varies by model type)
+            if hasattr(model, 'get_feature_importance'):
+                # CatBoost: feature_importances_ is a 0-d None array on models
+                # loaded from .cbm, so compute them from the trees instead
+                importances = np.asarray(model.get_feature_importance(), dtype=np.float32)
+            elif hasattr(model, 'feature_importances_'):
+                importances = model.feature_importances_
+            elif hasattr(model, 'feature_importance'):
+                # LightGBM Booster (loaded from the native text model)
+                importances = model.feature_importance(importance_type='gain').astype(np.float32)
+            elif hasattr(model, 'get_score'):
+                # XGBoost Booster (keyed by feature name when trained with names)
+                importance_dict = model.get_score(importance_type='gain')
+                keys = model.feature_names or XGB_DEFAULT_FEATURE_KEYS[:len(feature_names)]
+                importances = (
+                    pd.Series(importance_dict, dtype=np.float64)
+                    .reindex(keys, fill_value=0.0)
+                    .to_numpy(dtype=np.float32)
+                )
+            else:
+                importances = np.zeros(len(feature_names))
+            
+            # Normalize
+            if importances.sum() > 0:
+                importances = importances / importances.sum() * 100
+            
+            # Select top 20 features, then sort only those
+            top_n = min(20, len(importances))
+            part = np.argpartition(importances, -top_n)[-top_n:]
+            
+            cached = {
+                'importances': importances,
+                'sorted_indices': part[np.argsort(-importances[part])]
+            }
+            self.model_registry.importance_cache[model_name] = cached
         
-        # Sort and format
-        sorted_indices = np.argsort(importances)[::-1]
+        importances = cached['importances']
+        sorted_indices = cached['sorted_indices']
         
         feature_importance = []
-        for idx in sorted_indices[:20]:  # Top 20 features
+        for idx in sorted_indices:
             feature_importance.append({
                 "feature_name": feature_names[idx],
-                "importance": float(importances[idx]),
+                "importance": importances[idx],
                 "rank": len(feature_importance) + 1
             })
         
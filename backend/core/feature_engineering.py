@@ -3,18 +3,183 @@ Feature Engineering Pipeline
 Transforms raw input into 75 features for ML models
 """
 
+import threading
 import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import Dict, Any, List
+from numba import njit
+from typing import Dict, Any, List, Optional, Sequence
+
+
+# Features produced by engineer_from_input, in the order their values are computed
+INPUT_FEATURES = (
+    # [1-7] Bandwidth
+    'guard_bandwidth', 'middle_bandwidth', 'exit_bandwidth',
+    'guard_to_middle_bw_ratio', 'guard_to_exit_bw_ratio', 'middle_to_exit_bw_ratio',
+    'total_circuit_bandwidth', 'min_bandwidth', 'max_bandwidth', 'std_bandwidth',
+    # [8-12] Geographic
+    'same_country_guard_middle', 'same_country_guard_exit', 'same_country_middle_exit',
+    'country_diversity_score',
+    # [13-20] Historical aggregates
+    'guard_usage_frequency', 'middle_usage_frequency', 'exit_usage_frequency',
+    'guard_exit_cooccurrence_freq', 'guard_avg_bandwidth_all_circuits',
+    'guard_country_preference_score', 'middle_avg_bandwidth', 'exit_avg_bandwidth',
+    # [21-25] Encoded categoricals
+    'guard_country_encoded', 'middle_country_encoded', 'exit_country_encoded',
+    'guard_fingerprint_encoded', 'exit_fingerprint_encoded',
+    # [26-27] Interactions
+    'bandwidth_setup_time_interaction', 'total_bandwidth_bytes_interaction',
+    # [28-37] Temporal
+    'circuit_build_latency_ms', 'hour_of_day', 'day_of_week', 'circuit_lifetime_sec',
+    'time_since_last_circuit', 'cell_count_actual', 'cell_interarrival_mean_ms',
+    'stream_setup_latency_ms', 'idle_time_ratio', 'closure_reason_encoded',
+    # [38-45] Traffic
+    'bytes_sent_guard_to_middle', 'bytes_recv_middle_to_guard', 'bytes_sent_asymmetry_ratio',
+    'bandwidth_utilization', 'traffic_burst_score', 'congestion_indicator',
+    'stream_count', 'stream_multiplexing_count',
+    # [46-52] Network topology
+    'guard_as_number', 'exit_as_number', 'same_as_flag', 'as_path_length',
+    'relay_family_size', 'exit_policy_match_score', 'guard_stability_index',
+)
+
+# Stable country codes used when no fitted encoder is available
+# (str hashes are salted per process, so they cannot feed the model)
+DEFAULT_COUNTRY_CODES = {
+    country: code for code, country in enumerate(sorted([
+        'AT', 'CA', 'CH', 'CZ', 'DE', 'FI', 'FR', 'GB', 'NL', 'NO',
+        'PL', 'RO', 'RU', 'SE', 'UA', 'US'
+    ]))
+}
+
+
+@njit(cache=True, inline='always')
+def _put(out, positions, k, value):
+    """Store INPUT_FEATURES[k] at its model position, skipping features the model lacks"""
+    if positions[k] >= 0:
+        out[positions[k]] = value
+
+
+@njit(cache=True, fastmath=True)
+def _fill_input_features(out, positions, guard_bw, middle_bw, exit_bw, bandwidth,
+                         setup_duration, total_bytes, hour_of_day, day_of_week,
+                         circuit_lifetime, stream_count, same_gm, same_ge, same_me,
+                         country_diversity, guard_country_code, middle_country_code,
+                         exit_country_code, guard_fp_code, exit_fp_code,
+                         guard_as, exit_as):
+    """Compute INPUT_FEATURES values straight into out at their model positions"""
+    total_bw = guard_bw + middle_bw + exit_bw
+    mean_bw = total_bw / 3.0
+    
+    # [1-7] Bandwidth features
+    _put(out, positions, 0, guard_bw)
+    _put(out, positions, 1, middle_bw)
+    _put(out, positions, 2, exit_bw)
+    _put(out, positions, 3, guard_bw / (middle_bw + 0.001))
+    _put(out, positions, 4, guard_bw / (exit_bw + 0.001))
+    _put(out, positions, 5, middle_bw / (exit_bw + 0.001))
+    _put(out, positions, 6, total_bw)
+    _put(out, positions, 7, min(guard_bw, middle_bw, exit_bw))
+    _put(out, positions, 8, max(guard_bw, middle_bw, exit_bw))
+    _put(out, positions, 9, np.sqrt(((guard_bw - mean_bw) ** 2 + (middle_bw - mean_bw) ** 2 + (exit_bw - mean_bw) ** 2) / 3.0))
+    
+    # [8-12] Geographic features
+    _put(out, positions, 10, same_gm)
+    _put(out, positions, 11, same_ge)
+    _put(out, positions, 12, same_me)
+    _put(out, positions, 13, country_diversity)
+    
+    # [13-20] Historical aggregate features (estimated from typical patterns)
+    # In production, these would come from database lookups
+    _put(out, positions, 14, 0.5)  # Normalized frequency
+    _put(out, positions, 15, 0.5)
+    _put(out, positions, 16, 0.5)
+    _put(out, positions, 17, 0.1)
+    _put(out, positions, 18, guard_bw * 1.05)
+    _put(out, positions, 19, 0.3)
+    _put(out, positions, 20, middle_bw * 1.02)
+    _put(out, positions, 21, exit_bw * 0.98)
+    
+    # [21-25] Encoded categorical features
+    _put(out, positions, 22, guard_country_code)
+    _put(out, positions, 23, middle_country_code)
+    _put(out, positions, 24, exit_country_code)
+    _put(out, positions, 25, guard_fp_code)
+    _put(out, positions, 26, exit_fp_code)
+    
+    # [26-27] Interaction features
+    _put(out, positions, 27, bandwidth * setup_duration)
+    _put(out, positions, 28, total_bw * total_bytes / 1000000.0)
+    
+    # [28-37] Temporal features (NEW from Chutney - simulated for now)
+    _put(out, positions, 29, setup_duration * 1000.0)
+    _put(out, positions, 30, hour_of_day)
+    _put(out, positions, 31, day_of_week)
+    _put(out, positions, 32, circuit_lifetime)
+    _put(out, positions, 33, 5.0)  # Seconds since last circuit
+    _put(out, positions, 34, np.floor(total_bytes / 512.0))
+    _put(out, positions, 35, 10.5)
+    _put(out, positions, 36, 150.0)
+    _put(out, positions, 37, 0.3)
+    _put(out, positions, 38, 0.0)  # Closure reason: NORMAL
+    
+    # [38-45] Traffic features (NEW)
+    _put(out, positions, 39, total_bytes * 0.48)
+    _put(out, positions, 40, total_bytes * 0.48)
+    _put(out, positions, 41, 1.2)
+    _put(out, positions, 42, 0.65)
+    _put(out, positions, 43, 0.8)
+    _put(out, positions, 44, 0.15)
+    _put(out, positions, 45, stream_count)
+    _put(out, positions, 46, 3.0)
+    
+    # [46-52] Network topology features (NEW - simulated)
+    _put(out, positions, 47, guard_as)
+    _put(out, positions, 48, exit_as)
+    _put(out, positions, 49, 0.0)
+    _put(out, positions, 50, 3.0)
+    _put(out, positions, 51, 1.0)
+    _put(out, positions, 52, 0.9)
+    _put(out, positions, 53, guard_bw * 0.95)
+
+
+@njit(cache=True)
+def _fill_input_features_batch(out, positions, inputs):
+    """Row-wise _fill_input_features over an (N, 21) matrix of kernel inputs"""
+    for i in range(inputs.shape[0]):
+        r = inputs[i]
+        _fill_input_features(
+            out[i], positions, r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7],
+            r[8], r[9], r[10], r[11], r[12], r[13], r[14], r[15], r[16], r[17],
+            r[18], r[19], r[20]
+        )
 
 
 class FeatureEngineer:
     """Feature engineering for circuit data"""
     
-    def __init__(self, encoders: Dict[str, Any], feature_names: List[str]):
-        self.encoders = encoders
+    def __init__(self, encoders: Optional[Dict[str, Any]], feature_names: Sequence[str],
+                 feature_index: Optional[Dict[str, int]] = None):
+        # The registry leaves encoders as None when they fail to load; fall back
+        # to DEFAULT_COUNTRY_CODES then instead of failing at startup
+        self.encoders = encoders or {}
         self.feature_names = feature_names
+        
+        # Model feature position of each INPUT_FEATURES entry (-1 if the model
+        # was not trained on it); reuses the registry's map when given
+        if feature_index is None:
+            feature_index = {name: i for i, name in enumerate(feature_names)}
+        self._name_to_idx = feature_index
+        self._positions = np.array([self._name_to_idx.get(name, -1) for name in INPUT_FEATURES], dtype=np.int64)
+        
+        # Per-thread output buffers (handlers run in the threadpool)
+        self._tls = threading.local()
+        
+        # Class -> code lookups, so single values skip LabelEncoder.transform
+        self._encoder_maps = {
+            key: {cls: code for code, cls in enumerate(encoder.classes_)}
+            for key, encoder in self.encoders.items()
+            if hasattr(encoder, 'classes_')
+        }
     
     def engineer_from_input(self, input_data: Dict[str, Any]) -> np.ndarray:
         """
@@ -31,10 +196,36 @@ class FeatureEngineer:
                 - middle_fingerprint (for counterfactual)
                 
         Returns:
-            np.ndarray: Feature vector of shape (75,)
+            np.ndarray: Feature vector of shape (1, 75), reused by the next
+            call on the same thread
         """
         
-        features = {}
+        # Numeric features are computed in the jitted kernel; unset features stay zero
+        feature_vector = self._feature_buffer()
+        _fill_input_features(feature_vector[0], self._positions, *self._kernel_inputs(input_data))
+        
+        return feature_vector
+    
+    def engineer_from_inputs(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Transform several API inputs into a feature matrix
+        
+        Args:
+            rows: Input dictionaries, as accepted by engineer_from_input
+            
+        Returns:
+            np.ndarray: Feature matrix of shape (N, 75)
+        """
+        
+        feature_matrix = np.zeros((len(rows), len(self.feature_names)), dtype=np.float32)
+        if rows:
+            inputs = np.array([self._kernel_inputs(row) for row in rows], dtype=np.float64)
+            _fill_input_features_batch(feature_matrix, self._positions, inputs)
+        
+        return feature_matrix
+    
+    def _kernel_inputs(self, input_data: Dict[str, Any]) -> tuple:
+        """Parse, default and encode one input into _fill_input_features arguments"""
         
         # Extract base features
         exit_country = input_data.get('exit_country', 'DE')
@@ -43,137 +234,82 @@ class FeatureEngineer:
         
         # Parse timestamp
         try:
-            dt = pd.to_datetime(timestamp)
+            if isinstance(timestamp, datetime):
+                dt = timestamp
+            else:
+                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
             hour_of_day = dt.hour
-            day_of_week = dt.dayofweek
+            day_of_week = dt.weekday()
         except:
             hour_of_day = 14
             day_of_week = 3
         
-        # [1-7] Bandwidth features (using provided or estimated values)
+        # Bandwidth inputs (using provided or estimated values)
         guard_bw = input_data.get('guard_bandwidth', bandwidth * 1.2)
         middle_bw = input_data.get('middle_bandwidth', bandwidth * 1.1)
         exit_bw = bandwidth
         
-        features['guard_bandwidth'] = guard_bw
-        features['middle_bandwidth'] = middle_bw
-        features['exit_bandwidth'] = exit_bw
-        features['guard_to_middle_bw_ratio'] = guard_bw / (middle_bw + 0.001)
-        features['guard_to_exit_bw_ratio'] = guard_bw / (exit_bw + 0.001)
-        features['middle_to_exit_bw_ratio'] = middle_bw / (exit_bw + 0.001)
-        features['total_circuit_bandwidth'] = guard_bw + middle_bw + exit_bw
-        features['min_bandwidth'] = min(guard_bw, middle_bw, exit_bw)
-        features['max_bandwidth'] = max(guard_bw, middle_bw, exit_bw)
-        features['std_bandwidth'] = np.std([guard_bw, middle_bw, exit_bw])
-        
-        # [8-12] Geographic features
+        # Geographic inputs
         guard_country = input_data.get('guard_country', 'DE')
         middle_country = input_data.get('middle_country', 'NL')
         
-        features['same_country_guard_middle'] = int(guard_country == middle_country)
-        features['same_country_guard_exit'] = int(guard_country == exit_country)
-        features['same_country_middle_exit'] = int(middle_country == exit_country)
-        features['country_diversity_score'] = len(set([guard_country, middle_country, exit_country]))
-        
-        # [13-20] Historical aggregate features (estimated from typical patterns)
-        # In production, these would come from database lookups
-        features['guard_usage_frequency'] = 0.5  # Normalized frequency
-        features['middle_usage_frequency'] = 0.5
-        features['exit_usage_frequency'] = 0.5
-        features['guard_exit_cooccurrence_freq'] = 0.1
-        features['guard_avg_bandwidth_all_circuits'] = guard_bw * 1.05
-        features['guard_country_preference_score'] = 0.3
-        features['middle_avg_bandwidth'] = middle_bw * 1.02
-        features['exit_avg_bandwidth'] = exit_bw * 0.98
-        
-        # [21-25] Encoded categorical features
         # Encode countries
-        if 'guard_country_encoder' in self.encoders:
-            try:
-                features['guard_country_encoded'] = self.encoders['guard_country_encoder'].transform([guard_country])[0]
-            except:
-                features['guard_country_encoded'] = 0
+        if 'guard_country_encoder' in self._encoder_maps:
+            guard_country_encoded = self._encoder_maps['guard_country_encoder'].get(guard_country, 0)
         else:
-            features['guard_country_encoded'] = hash(guard_country) % 50
+            guard_country_encoded = DEFAULT_COUNTRY_CODES.get(guard_country, 0)
         
-        if 'middle_country_encoder' in self.encoders:
-            try:
-                features['middle_country_encoded'] = self.encoders['middle_country_encoder'].transform([middle_country])[0]
-            except:
-                features['middle_country_encoded'] = 0
+        if 'middle_country_encoder' in self._encoder_maps:
+            middle_country_encoded = self._encoder_maps['middle_country_encoder'].get(middle_country, 0)
         else:
-            features['middle_country_encoded'] = hash(middle_country) % 50
+            middle_country_encoded = DEFAULT_COUNTRY_CODES.get(middle_country, 0)
         
-        if 'exit_country_encoder' in self.encoders:
-            try:
-                features['exit_country_encoded'] = self.encoders['exit_country_encoder'].transform([exit_country])[0]
-            except:
-                features['exit_country_encoded'] = 0
+        if 'exit_country_encoder' in self._encoder_maps:
+            exit_country_encoded = self._encoder_maps['exit_country_encoder'].get(exit_country, 0)
         else:
-            features['exit_country_encoded'] = hash(exit_country) % 50
+            exit_country_encoded = DEFAULT_COUNTRY_CODES.get(exit_country, 0)
         
         # Fingerprint encoding (if provided)
         guard_fp = input_data.get('guard_fingerprint', 'UNKNOWN')
-        if 'guard_fingerprint_encoder' in self.encoders:
-            try:
-                features['guard_fingerprint_encoded'] = self.encoders['guard_fingerprint_encoder'].transform([guard_fp])[0]
-            except:
-                features['guard_fingerprint_encoded'] = 0
+        if 'guard_fingerprint_encoder' in self._encoder_maps:
+            guard_fingerprint_encoded = self._encoder_maps['guard_fingerprint_encoder'].get(guard_fp, 0)
         else:
-            features['guard_fingerprint_encoded'] = hash(guard_fp) % 500
+            guard_fingerprint_encoded = 0
         
-        features['exit_fingerprint_encoded'] = hash(input_data.get('exit_fingerprint', 'UNKNOWN')) % 500
+        exit_fingerprint_encoded = self._encoder_maps.get('exit_fingerprint_encoder', {}).get(
+            input_data.get('exit_fingerprint', 'UNKNOWN'), 0
+        )
         
-        # [26-27] Interaction features
+        # Traffic inputs
         circuit_setup_duration = input_data.get('circuit_setup_duration', 2.0)
         total_bytes = input_data.get('total_bytes', 500000)
         
-        features['bandwidth_setup_time_interaction'] = bandwidth * circuit_setup_duration
-        features['total_bandwidth_bytes_interaction'] = (guard_bw + middle_bw + exit_bw) * total_bytes / 1000000
-        
-        # [28-37] Temporal features (NEW from Chutney - simulated for now)
-        features['circuit_build_latency_ms'] = circuit_setup_duration * 1000
-        features['hour_of_day'] = hour_of_day
-        features['day_of_week'] = day_of_week
-        features['circuit_lifetime_sec'] = input_data.get('circuit_lifetime', 60.0)
-        features['time_since_last_circuit'] = 5.0  # Seconds
-        features['cell_count_actual'] = total_bytes // 512
-        features['cell_interarrival_mean_ms'] = 10.5
-        features['stream_setup_latency_ms'] = 150.0
-        features['idle_time_ratio'] = 0.3
-        features['closure_reason_encoded'] = 0  # NORMAL
-        
-        # [38-45] Traffic features (NEW)
-        features['bytes_sent_guard_to_middle'] = total_bytes * 0.48
-        features['bytes_recv_middle_to_guard'] = total_bytes * 0.48
-        features['bytes_sent_asymmetry_ratio'] = 1.2
-        features['bandwidth_utilization'] = 0.65
-        features['traffic_burst_score'] = 0.8
-        features['congestion_indicator'] = 0.15
-        features['stream_count'] = input_data.get('stream_count', 3)
-        features['stream_multiplexing_count'] = 3
-        
-        # [46-52] Network topology features (NEW - simulated)
-        features['guard_as_number'] = hash(guard_country) % 10000
-        features['exit_as_number'] = hash(exit_country) % 10000
-        features['same_as_flag'] = 0
-        features['as_path_length'] = 3
-        features['relay_family_size'] = 1
-        features['exit_policy_match_score'] = 0.9
-        features['guard_stability_index'] = guard_bw * 0.95
-        
-        # [53-75] Additional padding features (to reach 75 total)
-        for i in range(53, 76):
-            if f'feature_{i}' not in features:
-                features[f'feature_{i}'] = 0.0
-        
-        # Convert to ordered numpy array matching feature_names
-        feature_vector = np.zeros(75)
-        for i, name in enumerate(self.feature_names):
-            if name in features:
-                feature_vector[i] = features[name]
-        
-        return feature_vector
+        return (
+            float(guard_bw), float(middle_bw), float(exit_bw), float(bandwidth),
+            float(circuit_setup_duration), float(total_bytes),
+            float(hour_of_day), float(day_of_week),
+            float(input_data.get('circuit_lifetime', 60.0)),
+            float(input_data.get('stream_count', 3)),
+            float(guard_country == middle_country),
+            float(guard_country == exit_country),
+            float(middle_country == exit_country),
+            float(len({guard_country, middle_country, exit_country})),
+            float(guard_country_encoded), float(middle_country_encoded),
+            float(exit_country_encoded), float(guard_fingerprint_encoded),
+            float(exit_fingerprint_encoded),
+            # Simulated AS numbers, built like the training data's country code * 1000
+            float(guard_country_encoded * 1000), float(exit_country_encoded * 1000),
+        )
+    
+    def _feature_buffer(self) -> np.ndarray:
+        """Zeroed (1, n_features) float32 buffer owned by the calling thread"""
+        buf = getattr(self._tls, 'buf', None)
+        if buf is None:
+            buf = np.zeros((1, len(self.feature_names)), dtype=np.float32)
+            self._tls.buf = buf
+        else:
+            buf.fill(0.0)
+        return buf
     
     def engineer_from_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """
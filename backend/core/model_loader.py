@@ -5,9 +5,13 @@ Model Loader - Load and manage ML models
 import xgboost as xgb
 import lightgbm as lgb
 from catboost import CatBoostClassifier
+import shap
 import joblib
 import json
+import os
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Any, Optional
 import sys
@@ -21,77 +25,147 @@ from backend.config import (
 )
 
 
+def topk_indices(probs: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest probabilities along the last axis, highest first"""
+    k = min(k, probs.shape[-1])
+    idx = np.argpartition(probs, -k, axis=-1)[..., -k:]
+    order = np.argsort(np.take_along_axis(probs, idx, axis=-1), axis=-1)[..., ::-1]
+    return np.take_along_axis(idx, order, axis=-1)
+
+
 class ModelRegistry:
     """Registry for all ML models"""
     
     def __init__(self):
         self.models: Dict[str, Any] = {}
         self.feature_names = None
+        self.feature_index: Dict[str, int] = {}
         self.encoders = None
+        self.shap_explainers: Dict[str, Any] = {}
+        self.shap_explainer_errors: Dict[str, str] = {}
+        self._shap_lock = threading.Lock()
+        self.importance_cache: Dict[str, Dict[str, np.ndarray]] = {}
+        self.health_snapshot: Dict[str, Any] = {}
         self.num_classes = 500
         
     def load_all_models(self):
         """Load all trained models"""
         print("📦 Loading ML models...")
         
-        # Load XGBoost
-        try:
-            print(f"  Loading XGBoost from {XGBOOST_MODEL}")
-            xgb_model = xgb.Booster()
-            xgb_model.load_model(str(XGBOOST_MODEL))
-            self.models['xgboost'] = xgb_model
-            print(f"  ✅ XGBoost loaded")
-        except Exception as e:
-            print(f"  ⚠️ XGBoost load failed: {e}")
-            
-        # Load LightGBM
-        try:
-            print(f"  Loading LightGBM from {LIGHTGBM_MODEL}")
-            lgb_model = joblib.load(LIGHTGBM_MODEL)
-            self.models['lightgbm'] = lgb_model
-            print(f"  ✅ LightGBM loaded")
-        except Exception as e:
-            print(f"  ⚠️ LightGBM load failed: {e}")
-            
-        # Load CatBoost
-        try:
-            print(f"  Loading CatBoost from {CATBOOST_MODEL}")
-            cat_model = CatBoostClassifier()
-            cat_model.load_model(str(CATBOOST_MODEL))
-            self.models['catboost'] = cat_model
-            print(f"  ✅ CatBoost loaded")
-        except Exception as e:
-            print(f"  ⚠️ CatBoost load failed: {e}")
-            
-        # Load Ensemble metadata
-        try:
-            print(f"  Loading Ensemble from {ENSEMBLE_MODEL}")
-            ensemble_data = joblib.load(ENSEMBLE_MODEL)
-            self.models['ensemble'] = ensemble_data
-            print(f"  ✅ Ensemble loaded")
-        except Exception as e:
-            print(f"  ⚠️ Ensemble load failed: {e}")
+        # Deserialization is independent per artifact, so load them concurrently;
+        # results are collected in a fixed order to keep list_models() stable
+        loaders = {
+            'xgboost': ("XGBoost", XGBOOST_MODEL, self._load_xgboost),
+            'lightgbm': ("LightGBM", LIGHTGBM_MODEL, self._load_lightgbm),
+            'catboost': ("CatBoost", CATBOOST_MODEL, self._load_catboost),
+            'ensemble': ("Ensemble", ENSEMBLE_MODEL, joblib.load),
+        }
+        
+        with ThreadPoolExecutor(max_workers=len(loaders) + 2) as pool:
+            futures = {}
+            for model_id, (label, path, load) in loaders.items():
+                print(f"  Loading {label} from {path}")
+                futures[model_id] = pool.submit(load, path)
+            feature_names_future = pool.submit(self._load_json, FEATURE_NAMES)
+            encoders_future = pool.submit(joblib.load, LABEL_ENCODERS)
             
-        # Load feature names
-        try:
-            with open(FEATURE_NAMES, 'r') as f:
-                self.feature_names = json.load(f)
-            print(f"  ✅ Feature names loaded: {len(self.feature_names)} features")
-        except Exception as e:
-            print(f"  ⚠️ Feature names load failed: {e}")
+            for model_id, future in futures.items():
+                label = loaders[model_id][0]
+                try:
+                    self.models[model_id] = future.result()
+                    print(f"  ✅ {label} loaded")
+                except Exception as e:
+                    print(f"  ⚠️ {label} load failed: {e}")
             
-        # Load encoders
-        try:
-            self.encoders = joblib.load(LABEL_ENCODERS)
-            print(f"  ✅ Label encoders loaded")
-        except Exception as e:
-            print(f"  ⚠️ Encoders load failed: {e}")
+            # Load feature names
+            try:
+                # Immutable names plus a shared name -> position map for consumers
+                self.feature_names = tuple(feature_names_future.result())
+                self.feature_index = {name: i for i, name in enumerate(self.feature_names)}
+                print(f"  ✅ Feature names loaded: {len(self.feature_names)} features")
+            except Exception as e:
+                print(f"  ⚠️ Feature names load failed: {e}")
+                
+            # Load encoders
+            try:
+                self.encoders = encoders_future.result()
+                print(f"  ✅ Label encoders loaded")
+            except Exception as e:
+                print(f"  ⚠️ Encoders load failed: {e}")
             
         if not self.models:
             raise RuntimeError("❌ No models loaded successfully!")
             
+        # Loaded state is fixed from here on; precompute it for /health
+        self.health_snapshot = {
+            "models_loaded": self.list_models(),
+            "num_models": len(self.models),
+            "encoders_loaded": bool(self.encoders)
+        }
+            
         print(f"✅ All models loaded successfully!")
         
+    def get_shap_explainer(self, model_id: str = 'xgboost'):
+        """
+        Return the SHAP explainer for a model, building it on first use
+        
+        Explainers are large, so each is built lazily and only once per model:
+        concurrent callers wait on a lock, and a failed build is remembered
+        and re-raised for that model instead of being retried on every request.
+        """
+        explainer = self.shap_explainers.get(model_id)
+        if explainer is not None:
+            return explainer
+        if model_id not in self.models:
+            raise ValueError(f"Model '{model_id}' not found. Available: {self.list_models()}")
+        
+        with self._shap_lock:
+            if model_id not in self.shap_explainers and model_id not in self.shap_explainer_errors:
+                try:
+                    # tree_path_dependent needs no background data
+                    self.shap_explainers[model_id] = shap.TreeExplainer(
+                        self.models[model_id],
+                        feature_perturbation='tree_path_dependent'
+                    )
+                    print(f"  ✅ SHAP explainer ready for {model_id}")
+                except Exception as e:
+                    self.shap_explainer_errors[model_id] = f"{type(e).__name__}: {e}"
+                    print(f"  ⚠️ SHAP explainer build failed for {model_id}: {e}")
+        
+        if model_id in self.shap_explainer_errors:
+            raise RuntimeError(f"SHAP explainer unavailable for {model_id} ({self.shap_explainer_errors[model_id]})")
+        return self.shap_explainers[model_id]
+    
+    @staticmethod
+    def _load_xgboost(path):
+        """Load an XGBoost Booster"""
+        model = xgb.Booster()
+        model.load_model(str(path))
+        model.set_param({'nthread': os.cpu_count() or 1})
+        return model
+    
+    @staticmethod
+    def _load_lightgbm(path):
+        """Load a LightGBM Booster from its native text format"""
+        legacy = Path(path).with_suffix('.pkl')
+        if not Path(path).exists() and legacy.exists():
+            # Models trained before the switch to the native format were pickled sklearn wrappers
+            return joblib.load(legacy).booster_
+        return lgb.Booster(model_file=str(path))
+    
+    @staticmethod
+    def _load_catboost(path):
+        """Load a CatBoost classifier"""
+        model = CatBoostClassifier()
+        model.load_model(str(path))
+        return model
+    
+    @staticmethod
+    def _load_json(path):
+        """Load a JSON artifact"""
+        with open(path, 'r') as f:
+            return json.load(f)
+        
     def get_model(self, model_id: str):
         """Get a specific model by ID"""
         return self.models.get(model_id)
@@ -103,21 +177,43 @@ class ModelRegistry:
     def predict(self, model_id: str, features: np.ndarray, top_k: int = 10):
         """Make prediction using specified model"""
         
+        proba = self.predict_proba(model_id, features)
+        
+        # Get top-k predictions
+        top_k_indices = topk_indices(proba[0], top_k)
+        top_k_probs = proba[0][top_k_indices]
+        
+        # Normalize to percentages
+        total_prob = np.sum(top_k_probs)
+        if total_prob > 0:
+            top_k_probs = (top_k_probs / total_prob) * 100
+            
+        return top_k_indices, top_k_probs
+        
+    def predict_proba(self, model_id: str, features: np.ndarray) -> np.ndarray:
+        """Raw class probabilities of shape (N, num_classes) from the specified model"""
+        
         if model_id not in self.models:
             raise ValueError(f"Model '{model_id}' not found. Available: {self.list_models()}")
             
         model = self.models[model_id]
         
+        # XGBoost predicts in float32; casting once up front avoids a copy per call
+        features = np.asarray(features, dtype=np.float32)
+        
         # Handle different model types
         if model_id == 'xgboost':
-            dmatrix = xgb.DMatrix(features, feature_names=self.feature_names)
-            proba = model.predict(dmatrix)
+            # Dense NumPy input can skip DMatrix construction entirely
+            proba = model.inplace_predict(features)
             
         elif model_id == 'lightgbm':
-            proba = model.predict_proba(features)
+            # Multiclass Booster.predict returns class probabilities
+            proba = model.predict(features)
             
         elif model_id == 'catboost':
-            proba = model.predict_proba(features)
+            # CatBoost marks its input read-only, so give it a copy and keep
+            # callers' reusable feature buffers writable
+            proba = model.predict_proba(features.copy())
             
         elif model_id == 'ensemble':
             # Ensemble: average predictions from all models
@@ -125,35 +221,29 @@ class ModelRegistry:
             lgb_model = self.models.get('lightgbm')
             cat_model = self.models.get('catboost')
             
-            probas = []
+            # Weighted sum accumulated in place into the first model's output
+            proba = None
             
             if xgb_model:
-                dmatrix = xgb.DMatrix(features, feature_names=self.feature_names)
-                probas.append(xgb_model.predict(dmatrix) * 0.4)
+                proba = xgb_model.inplace_predict(features)
+                proba *= 0.4
                 
             if lgb_model:
-                probas.append(lgb_model.predict_proba(features) * 0.3)
+                lgb_proba = lgb_model.predict(features)
+                lgb_proba *= 0.3
+                proba = lgb_proba if proba is None else np.add(proba, lgb_proba, out=proba)
                 
             if cat_model:
-                probas.append(cat_model.predict_proba(features) * 0.3)
+                cat_proba = cat_model.predict_proba(features.copy())
+                cat_proba *= 0.3
+                proba = cat_proba if proba is None else np.add(proba, cat_proba, out=proba)
                 
-            if not probas:
+            if proba is None:
                 raise RuntimeError("No models available for ensemble")
-                
-            proba = np.sum(probas, axis=0)
         else:
             raise ValueError(f"Unknown model type: {model_id}")
             
-        # Get top-k predictions
-        top_k_indices = np.argsort(proba[0])[-top_k:][::-1]
-        top_k_probs = proba[0][top_k_indices]
-        
-        # Normalize to percentages
-        total_prob = np.sum(top_k_probs)
-        if total_prob > 0:
-            top_k_probs = (top_k_probs / total_prob) * 100
-            
-        return top_k_indices, top_k_probs
+        return proba
         
     def encode_features(self, raw_data: Dict[str, Any]) -> np.ndarray:
         """Encode raw input into feature vector"""
@@ -161,7 +251,7 @@ class ModelRegistry:
         # This is a simplified version - you'd implement full feature engineering here
         # For now, create a basic feature vector
         
-        features = np.zeros((1, len(self.feature_names)))
+        features = np.zeros((1, len(self.feature_names)), dtype=np.float32)
         
         # Extract basic features (simplified)
         features[0, 0] = raw_data.get('bandwidth', 7.5)
@@ -6,7 +6,8 @@ Handles ML inference and result formatting
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Any
-import xgboost as xgb
+
+from backend.core.model_loader import topk_indices
 
 
 class PredictionService:
@@ -15,6 +16,12 @@ class PredictionService:
     def __init__(self, model_registry, feature_engineer):
         self.model_registry = model_registry
         self.feature_engineer = feature_engineer
+        
+        # Placeholder guard metadata, built once per class index
+        num_classes = model_registry.num_classes
+        self._ip_table = [self._get_guard_ip(i) for i in range(num_classes)]
+        self._country_table = [self._get_guard_country(i) for i in range(num_classes)]
+        self._bandwidth_table = [self._get_guard_bandwidth(i) for i in range(num_classes)]
     
     def predict(self, input_data: Dict[str, Any], model_name: str = "ensemble", top_k: int = 10) -> Dict[str, Any]:
         """
@@ -30,45 +37,65 @@ class PredictionService:
         """
         
         # Engineer features
-        features = self.feature_engineer.engineer_from_input(input_data)
-        features_2d = features.reshape(1, -1)
+        features_2d = self.feature_engineer.engineer_from_input(input_data)
+        probs = self.model_registry.predict_proba(model_name, features_2d)[0]
+        
+        return {
+            "success": True,
+            "predictions": self._format_predictions(probs, topk_indices(probs, top_k)),
+            "model_used": model_name,
+            "total_guards": len(probs),
+            "top_k": top_k
+        }
+    
+    def predict_batch(self, rows: List[Dict[str, Any]], model_name: str = "ensemble", top_k: int = 10) -> Dict[str, Any]:
+        """
+        Make predictions for several inputs with one model call
+        
+        Args:
+            rows: Input features, one dictionary per circuit
+            model_name: Which model to use
+            top_k: Number of top predictions to return per input
+            
+        Returns:
+            Dictionary with one prediction list per input and metadata
+        """
         
-        # Get model
-        model = self.model_registry.get_model(model_name)
+        # Engineer features
+        features = self.feature_engineer.engineer_from_inputs(rows)
+        probs = self.model_registry.predict_proba(model_name, features)
         
-        # Predict probabilities
-        if model_name == 'xgboost':
-            # XGBoost Booster requires DMatrix
-            dmatrix = xgb.DMatrix(features_2d, feature_names=self.feature_engineer.feature_names)
-            probs = model.predict(dmatrix)[0]
-        else:
-            # sklearn-like interface
-            probs = model.predict_proba(features_2d)[0]
+        # Per-row top-k in one partition over the class axis
+        top_indices = topk_indices(probs, top_k)
         
-        # Get top-k indices
-        top_indices = np.argsort(probs)[-top_k:][::-1]
+        return {
+            "success": True,
+            "results": [
+                self._format_predictions(row_probs, row_top)
+                for row_probs, row_top in zip(probs, top_indices)
+            ],
+            "model_used": model_name,
+            "total_guards": probs.shape[1],
+            "top_k": top_k
+        }
+    
+    def _format_predictions(self, probs: np.ndarray, top_indices: np.ndarray) -> List[Dict[str, Any]]:
+        """Build the response entries for one input's top-k guards"""
         
-        # Format predictions
         predictions = []
         for rank, idx in enumerate(top_indices, 1):
             predictions.append({
                 "rank": rank,
                 "guard_index": int(idx),
                 "guard_fingerprint": f"Guard_{idx:03d}",  # Placeholder - will be mapped from training
-                "guard_ip": self._get_guard_ip(idx),
-                "country": self._get_guard_country(idx),
+                "guard_ip": self._ip_table[idx],
+                "country": self._country_table[idx],
                 "confidence": float(probs[idx] * 100),  # Convert to percentage
                 "probability": float(probs[idx]),
-                "bandwidth": self._get_guard_bandwidth(idx)
+                "bandwidth": self._bandwidth_table[idx]
             })
         
-        return {
-            "success": True,
-            "predictions": predictions,
-            "model_used": model_name,
-            "total_guards": len(probs),
-            "top_k": top_k
-        }
+        return predictions
     
     def _get_guard_ip(self, guard_idx: int) -> str:
         """Map guard index to IP (placeholder)"""
@@ -82,6 +109,6 @@ class PredictionService:
     
     def _get_guard_bandwidth(self, guard_idx: int) -> float:
         """Map guard index to bandwidth (placeholder)"""
-        # Simulated bandwidth between 1-10 MB/s
-        np.random.seed(guard_idx)
-        return round(np.random.uniform(1.0, 10.0), 2)
+        # Simulated bandwidth between 1-10 MB/s, seeded per guard without
+        # touching the global NumPy RNG
+        return round(float(np.random.RandomState(guard_idx).uniform(1.0, 10.0)), 2)
@@ -6,9 +6,15 @@ TOR Guard Node Predictor - TN Police Hackathon 2025
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import anyio
 import uvicorn
 
+from backend.config import API_THREADPOOL_SIZE
 from backend.core.model_loader import get_registry
+from backend.core.feature_engineering import FeatureEngineer
+from backend.core.prediction_service import PredictionService
+from backend.core.counterfactual_service import CounterfactualService
+from backend.core.explainability_service import ExplainabilityService
 from backend.api import predict, health, explain, counterfactual, models
 from backend.api import tor_consensus
 
@@ -18,10 +24,34 @@ async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     print("?? Starting TOR Guard Predictor API...")
     print("?? Loading ML models...")
+    # Sync endpoints run in anyio's worker threads; size the pool for CPU-bound inference
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
     try:
         registry = get_registry()
         registry.load_all_models()
+        app.state.model_registry = registry
         print("? All models loaded successfully!")
+        
+        # Build services once and share them across requests
+        feature_engineer = FeatureEngineer(
+            encoders=registry.encoders,
+            feature_names=registry.feature_names,
+            feature_index=registry.feature_index
+        )
+        prediction_service = PredictionService(
+            model_registry=registry,
+            feature_engineer=feature_engineer
+        )
+        app.state.feature_engineer = feature_engineer
+        app.state.prediction_service = prediction_service
+        app.state.counterfactual_service = CounterfactualService(
+            prediction_service=prediction_service,
+            feature_engineer=feature_engineer
+        )
+        app.state.explainability_service = ExplainabilityService(
+            model_registry=registry,
+            feature_engineer=feature_engineer
+        )
     except Exception as e:
         print(f"? Model loading failed: {e}")
         raise
@@ -20,7 +20,7 @@ print("="*60)
 
 # Load data
 print(f"\n[1/5] Loading data from {CSV_FILE}...")
-df = pd.read_csv(CSV_FILE)
+df = pd.read_csv(CSV_FILE, engine="pyarrow")
 print(f"✅ Loaded {len(df)} circuits")
 
 # Basic statistics
@@ -7,6 +7,7 @@ FIXED: Ensures all output columns are numeric
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import LabelEncoder
+from sklearn.model_selection import train_test_split
 from pathlib import Path
 import joblib
 import json
@@ -14,6 +15,7 @@ import json
 # Paths
 DATA_DIR = Path("data")
 RAW_DATA = DATA_DIR / "raw" / "circuit_data_raw.csv"
+RAW_DATA_PARQUET = DATA_DIR / "raw" / "circuit_data_raw.parquet"
 PROCESSED_DIR = DATA_DIR / "processed"
 PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -26,22 +28,32 @@ print("="*70)
 
 # Load data
 print(f"\n[1/7] Loading raw data from {RAW_DATA}...")
-df = pd.read_csv(RAW_DATA)
+df = pd.read_csv(RAW_DATA, engine="pyarrow")
 print(f"✅ Loaded {len(df)} circuits with {df.shape[1]} raw features")
 
+# Parquet copy of the raw data for fast API startup
+df.to_parquet(RAW_DATA_PARQUET, engine="pyarrow", index=False)
+print(f"✅ Saved raw Parquet copy: {RAW_DATA_PARQUET}")
+
 print(f"\n[2/7] Engineering features...")
 
 # ============================================================================
 # BANDWIDTH FEATURES (10 features)
 # ============================================================================
 print("  🔧 Bandwidth features...")
-df['guard_to_middle_bw_ratio'] = df['guard_bandwidth'] / (df['middle_bandwidth'] + 0.001)
-df['guard_to_exit_bw_ratio'] = df['guard_bandwidth'] / (df['exit_bandwidth'] + 0.001)
-df['middle_to_exit_bw_ratio'] = df['middle_bandwidth'] / (df['exit_bandwidth'] + 0.001)
-df['total_circuit_bandwidth'] = df['guard_bandwidth'] + df['middle_bandwidth'] + df['exit_bandwidth']
-df['min_bandwidth'] = df[['guard_bandwidth', 'middle_bandwidth', 'exit_bandwidth']].min(axis=1)
-df['max_bandwidth'] = df[['guard_bandwidth', 'middle_bandwidth', 'exit_bandwidth']].max(axis=1)
-df['std_bandwidth'] = df[['guard_bandwidth', 'middle_bandwidth', 'exit_bandwidth']].std(axis=1)
+guard_bw = df['guard_bandwidth'].to_numpy()
+middle_bw = df['middle_bandwidth'].to_numpy()
+exit_bw = df['exit_bandwidth'].to_numpy()
+bw = np.stack([guard_bw, middle_bw, exit_bw], axis=1)
+
+df['guard_to_middle_bw_ratio'] = guard_bw / (middle_bw + 0.001)
+exit_denom = exit_bw + 0.001
+df['guard_to_exit_bw_ratio'] = guard_bw / exit_denom
+df['middle_to_exit_bw_ratio'] = middle_bw / exit_denom
+df['total_circuit_bandwidth'] = bw.sum(axis=1)
+df['min_bandwidth'] = bw.min(axis=1)
+df['max_bandwidth'] = bw.max(axis=1)
+df['std_bandwidth'] = bw.std(axis=1, ddof=1)
 df['bandwidth_range'] = df['max_bandwidth'] - df['min_bandwidth']
 df['avg_bandwidth'] = df['total_circuit_bandwidth'] / 3
 df['bandwidth_cv'] = df['std_bandwidth'] / (df['avg_bandwidth'] + 0.001)
@@ -50,39 +62,62 @@ df['bandwidth_cv'] = df['std_bandwidth'] / (df['avg_bandwidth'] + 0.001)
 # GEOGRAPHIC FEATURES (5 features)
 # ============================================================================
 print("  🌍 Geographic features...")
-df['same_country_guard_middle'] = (df['guard_country'] == df['middle_country']).astype(int)
-df['same_country_guard_exit'] = (df['guard_country'] == df['exit_country']).astype(int)
-df['same_country_middle_exit'] = (df['middle_country'] == df['exit_country']).astype(int)
-df['all_same_country'] = ((df['guard_country'] == df['middle_country']) & 
-                          (df['middle_country'] == df['exit_country'])).astype(int)
-df['country_diversity_score'] = df.apply(
-    lambda row: len(set([row['guard_country'], row['middle_country'], row['exit_country']])), 
-    axis=1
-)
+guard_c = df['guard_country'].to_numpy()
+middle_c = df['middle_country'].to_numpy()
+exit_c = df['exit_country'].to_numpy()
+same_gm = guard_c == middle_c
+same_ge = guard_c == exit_c
+same_me = middle_c == exit_c
+
+df['same_country_guard_middle'] = same_gm.astype(np.int8)
+df['same_country_guard_exit'] = same_ge.astype(np.int8)
+df['same_country_middle_exit'] = same_me.astype(np.int8)
+df['all_same_country'] = (same_gm & same_me).astype(np.int8)
+# Number of distinct countries among guard/middle/exit
+df['country_diversity_score'] = 1 + ~same_gm + (~same_ge & ~same_me)
 
 # ============================================================================
 # TEMPORAL FEATURES (8 features)
 # ============================================================================
 print("  ⏰ Temporal features...")
-df['timestamp'] = pd.to_datetime(df['timestamp'])
+df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
 df['hour_of_day'] = df['timestamp'].dt.hour
 df['day_of_week'] = df['timestamp'].dt.dayofweek
 df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
 df['is_night'] = ((df['hour_of_day'] >= 22) | (df['hour_of_day'] <= 6)).astype(int)
 df['circuit_setup_duration_ms'] = df['circuit_setup_duration'] * 1000
-df['build_time_sec'] = pd.to_timedelta(df['timestamp'] - df['timestamp'].iloc[0]).dt.total_seconds()
+df['build_time_sec'] = (df['timestamp'] - df['timestamp'].iloc[0]).dt.total_seconds()
 df['time_since_last_circuit'] = df.groupby('guard_fingerprint')['build_time_sec'].diff().fillna(0)
-df['circuits_per_hour_bucket'] = df.groupby([df['timestamp'].dt.floor('H'), 'guard_fingerprint']).cumcount() + 1
+# Running count per (hour bucket, guard): stable sort by the pair, restart the
+# counter at each key change, then scatter back to the original row order
+hour_bucket = df['timestamp'].dt.floor('H').array.asi8
+guard_codes = pd.factorize(df['guard_fingerprint'])[0]
+order = np.lexsort((hour_bucket, guard_codes))
+sorted_bucket = hour_bucket[order]
+sorted_guard = guard_codes[order]
+reset = np.ones(len(df), dtype=bool)
+reset[1:] = (sorted_bucket[1:] != sorted_bucket[:-1]) | (sorted_guard[1:] != sorted_guard[:-1])
+positions = np.arange(len(df))
+run_start = np.maximum.accumulate(np.where(reset, positions, 0))
+circuits_per_hour = np.empty(len(df), dtype=np.int64)
+circuits_per_hour[order] = positions - run_start + 1
+df['circuits_per_hour_bucket'] = circuits_per_hour
 
 # ============================================================================
 # TRAFFIC FEATURES (7 features)
 # ============================================================================
 print("  📊 Traffic features...")
-df['bytes_per_second'] = df['total_bytes'] / (df['circuit_setup_duration'] + 0.001)
-df['bandwidth_utilization'] = df['bytes_per_second'] / ((df['guard_bandwidth'] * 1024 * 1024) + 0.001)
+# Arithmetic runs through pandas.eval (numexpr when installed) in one fused pass;
+# statements are split so the column order stays the same
+df.eval("""
+bytes_per_second = total_bytes / (circuit_setup_duration + 0.001)
+bandwidth_utilization = bytes_per_second / ((guard_bandwidth * 1024 * 1024) + 0.001)
+""", inplace=True)
 df['cell_count_estimate'] = df['total_bytes'] // 512
-df['bytes_to_bandwidth_ratio'] = df['total_bytes'] / (df['total_circuit_bandwidth'] + 0.001)
-df['traffic_efficiency'] = df['total_bytes'] / (df['circuit_setup_duration'] * df['total_circuit_bandwidth'] + 0.001)
+df.eval("""
+bytes_to_bandwidth_ratio = total_bytes / (total_circuit_bandwidth + 0.001)
+traffic_efficiency = total_bytes / (circuit_setup_duration * total_circuit_bandwidth + 0.001)
+""", inplace=True)
 df['guard_traffic_share'] = 0.33
 df['exit_traffic_share'] = 0.33
 
@@ -92,39 +127,27 @@ df['exit_traffic_share'] = 0.33
 print("  📈 Historical aggregate features...")
 
 # Guard statistics
-guard_stats = df.groupby('guard_fingerprint').agg({
-    'circuit_id': 'count',
-    'guard_bandwidth': 'mean',
-    'total_bytes': 'mean',
-    'circuit_setup_duration': 'mean'
-}).reset_index()
-guard_stats.columns = ['guard_fingerprint', 'guard_usage_frequency', 'guard_avg_bandwidth', 
-                       'guard_avg_bytes', 'guard_avg_setup_time']
-guard_stats['guard_usage_frequency'] = guard_stats['guard_usage_frequency'] / len(df)
-df = df.merge(guard_stats, on='guard_fingerprint', how='left')
+guard_gb = df.groupby('guard_fingerprint', sort=False)
+guard_counts = guard_gb['circuit_id'].transform('size')
+df['guard_usage_frequency'] = guard_gb['circuit_id'].transform('count') / len(df)
+df['guard_avg_bandwidth'] = guard_gb['guard_bandwidth'].transform('mean')
+df['guard_avg_bytes'] = guard_gb['total_bytes'].transform('mean')
+df['guard_avg_setup_time'] = guard_gb['circuit_setup_duration'].transform('mean')
 
 # Exit statistics
-exit_stats = df.groupby('exit_fingerprint').agg({
-    'circuit_id': 'count',
-    'exit_bandwidth': 'mean'
-}).reset_index()
-exit_stats.columns = ['exit_fingerprint', 'exit_usage_frequency', 'exit_avg_bandwidth']
-exit_stats['exit_usage_frequency'] = exit_stats['exit_usage_frequency'] / len(df)
-df = df.merge(exit_stats, on='exit_fingerprint', how='left')
+exit_gb = df.groupby('exit_fingerprint', sort=False)
+df['exit_usage_frequency'] = exit_gb['circuit_id'].transform('count') / len(df)
+df['exit_avg_bandwidth'] = exit_gb['exit_bandwidth'].transform('mean')
 
 # Guard-Exit co-occurrence
-guard_exit_pairs = df.groupby(['guard_fingerprint', 'exit_fingerprint']).size().reset_index(name='cooccurrence_count')
-guard_exit_pairs['guard_exit_cooccurrence_freq'] = guard_exit_pairs['cooccurrence_count'] / len(df)
-df = df.merge(guard_exit_pairs[['guard_fingerprint', 'exit_fingerprint', 'guard_exit_cooccurrence_freq']], 
-              on=['guard_fingerprint', 'exit_fingerprint'], how='left')
+df['guard_exit_cooccurrence_freq'] = (
+    df.groupby(['guard_fingerprint', 'exit_fingerprint'], sort=False)['circuit_id'].transform('size') / len(df)
+)
 
 # Country preferences
-guard_country_pref = df.groupby(['guard_fingerprint', 'guard_country']).size().reset_index(name='country_count')
-total_per_guard = guard_country_pref.groupby('guard_fingerprint')['country_count'].sum().reset_index(name='total')
-guard_country_pref = guard_country_pref.merge(total_per_guard, on='guard_fingerprint')
-guard_country_pref['guard_country_preference_score'] = guard_country_pref['country_count'] / guard_country_pref['total']
-df = df.merge(guard_country_pref[['guard_fingerprint', 'guard_country', 'guard_country_preference_score']], 
-              on=['guard_fingerprint', 'guard_country'], how='left')
+df['guard_country_preference_score'] = (
+    df.groupby(['guard_fingerprint', 'guard_country'], sort=False)['circuit_id'].transform('size') / guard_counts
+)
 
 # Middle node stats
 df['middle_usage_frequency'] = df.groupby('middle_fingerprint')['circuit_id'].transform('count') / len(df)
@@ -165,8 +188,10 @@ for col in ['guard_fingerprint', 'exit_fingerprint']:
 # NETWORK TOPOLOGY FEATURES (8 features)
 # ============================================================================
 print("  🌐 Network topology features...")
-df['guard_as_number'] = df['guard_country_encoded'] * 1000 + np.random.randint(0, 100, len(df))
-df['exit_as_number'] = df['exit_country_encoded'] * 1000 + np.random.randint(0, 100, len(df))
+# Seeded so the simulated AS features are reproducible across runs
+rng = np.random.default_rng(42)
+df['guard_as_number'] = df['guard_country_encoded'] * 1000 + rng.integers(0, 100, len(df), dtype=np.int32)
+df['exit_as_number'] = df['exit_country_encoded'] * 1000 + rng.integers(0, 100, len(df), dtype=np.int32)
 df['same_as_flag'] = (df['guard_as_number'] == df['exit_as_number']).astype(int)
 df['as_path_length'] = np.abs(df['guard_as_number'] - df['exit_as_number']) // 1000 + 1
 df['relay_family_size'] = 1
@@ -178,11 +203,13 @@ df['network_distance_estimate'] = df['as_path_length'] * df['circuit_setup_durat
 # ADDITIONAL FEATURES (padding to reach 75)
 # ============================================================================
 print("  ➕ Additional derived features...")
-df['log_guard_bandwidth'] = np.log1p(df['guard_bandwidth'])
-df['log_total_bytes'] = np.log1p(df['total_bytes'])
-df['squared_setup_duration'] = df['circuit_setup_duration'] ** 2
-df['bandwidth_entropy'] = -((df['guard_bandwidth'] / (df['total_circuit_bandwidth'] + 0.001)) * 
-                            np.log2((df['guard_bandwidth'] / (df['total_circuit_bandwidth'] + 0.001)) + 0.001))
+df.eval("""
+log_guard_bandwidth = log1p(guard_bandwidth)
+log_total_bytes = log1p(total_bytes)
+squared_setup_duration = circuit_setup_duration ** 2
+""", inplace=True)
+guard_share = df['guard_bandwidth'].to_numpy() / (df['total_circuit_bandwidth'].to_numpy() + 0.001)
+df['bandwidth_entropy'] = -(guard_share * np.log2(guard_share + 0.001))
 
 # ============================================================================
 # TARGET VARIABLE
@@ -206,8 +233,13 @@ exclude_cols = [
     'guard_label'  # Target variable - will add back separately
 ]
 
-# Get all numeric columns
-numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+def is_numeric_dtype(dtype):
+    """Same rule as select_dtypes(include=np.number): NumPy numeric dtypes, no bool/datetime/category"""
+    return isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.number)
+
+
+# Get all numeric columns from a single pass over the dtypes
+numeric_cols = [col for col, dtype in df.dtypes.items() if is_numeric_dtype(dtype)]
 
 # Remove guard_label from features (it's our target)
 feature_cols = [col for col in numeric_cols if col not in ['guard_label']]
@@ -219,11 +251,11 @@ if len(feature_cols) > 75:
     feature_cols = feature_cols[:75]
     print(f"   Truncated to 75 features")
 elif len(feature_cols) < 75:
-    # Add dummy features to reach 75
-    while len(feature_cols) < 75:
-        dummy_name = f'dummy_feature_{len(feature_cols)}'
-        df[dummy_name] = 0.0
-        feature_cols.append(dummy_name)
+    # Add dummy features to reach 75 in one concat instead of one block copy per column
+    dummy_cols = [f'dummy_feature_{i}' for i in range(len(feature_cols), 75)]
+    dummies = pd.DataFrame(np.zeros((len(df), len(dummy_cols)), dtype=np.float32), columns=dummy_cols, index=df.index)
+    df = pd.concat([df, dummies], axis=1)
+    feature_cols += dummy_cols
     print(f"   Padded to 75 features")
 
 print(f"✅ Final feature count: {len(feature_cols)}")
@@ -235,7 +267,7 @@ print("\n[5/7] Verifying data types...")
 df_final = df[feature_cols + ['guard_label']].copy()
 
 # Check for non-numeric columns
-non_numeric = df_final.select_dtypes(exclude=[np.number]).columns.tolist()
+non_numeric = [col for col, dtype in df_final.dtypes.items() if not is_numeric_dtype(dtype)]
 if non_numeric:
     print(f"❌ ERROR: Non-numeric columns found: {non_numeric}")
     raise ValueError("All features must be numeric!")
@@ -246,14 +278,30 @@ else:
 df_final = df_final.fillna(0)
 print(f"✅ Missing values handled")
 
+# Tree learners bin features internally, so float64 precision is wasted;
+# float32 halves the file and skips the cast when building DMatrix
+df_final[feature_cols] = df_final[feature_cols].astype(np.float32)
+df_final['guard_label'] = df_final['guard_label'].astype(np.int32)
+print(f"✅ Downcast features to float32, target to int32")
+
 # ============================================================================
 # SAVE PROCESSED DATA
 # ============================================================================
 print("\n[6/7] Saving processed data...")
 
-output_file = PROCESSED_DIR / "circuits_engineered_75_features.csv"
-df_final.to_csv(output_file, index=False)
+# Parquet keeps dtypes and loads much faster than CSV in scripts 03-07 and the API
+output_file = PROCESSED_DIR / "circuits_engineered_75_features.parquet"
+df_final.to_parquet(output_file, engine="pyarrow", compression="zstd", index=False)
 print(f"✅ Saved engineered dataset: {output_file}")
+
+# Row positions of the 70/15/15 stratified split, shared by scripts 03-06
+positions = np.arange(len(df_final))
+labels = df_final['guard_label'].to_numpy()
+temp_idx, test_idx = train_test_split(positions, test_size=0.15, random_state=42, stratify=labels)
+train_idx, val_idx = train_test_split(temp_idx, test_size=0.1765, random_state=42, stratify=labels[temp_idx])
+splits_file = PROCESSED_DIR / "splits.npz"
+np.savez(splits_file, train=train_idx, val=val_idx, test=test_idx)
+print(f"✅ Saved train/val/test split: {splits_file}")
 print(f"   Shape: {df_final.shape}")
 print(f"   Columns: {df_final.columns.tolist()[:10]}... (showing first 10)")
 
@@ -280,7 +328,7 @@ print("✅ FEATURE ENGINEERING COMPLETE!")
 print(f"   Input: {len(df)} circuits × {df.shape[1]} original columns")
 print(f"   Output: {len(df_final)} circuits × {len(feature_cols)} features + 1 target")
 print(f"   Target classes: {df_final['guard_label'].nunique()}")
-print(f"   All columns numeric: {df_final.select_dtypes(exclude=[np.number]).shape[1] == 0}")
+print(f"   All columns numeric: {not non_numeric}")
 print("="*70)
 
 # Print sample data types
@@ -5,53 +5,60 @@ XGBoost Model Training
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
 import json
+import os
 import time
 from pathlib import Path
 
+from _common import compute_top_k_accuracies, load_splits
+
 # Paths
-DATA_FILE = Path("data/processed/circuits_engineered_75_features.csv")
 MODEL_DIR = Path("models/xgboost")
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
+# Training device: "cpu" (default) or "cuda" for GPU training
+TRAIN_DEVICE = os.environ.get("TRAIN_DEVICE", "cpu")
+
+# "multi_output_tree" grows one tree per round with a vector leaf over all
+# classes instead of one tree per class; much faster for 500 classes, but
+# XGBoost cannot compute SHAP contributions for such models (07 and /explain)
+MULTI_STRATEGY = os.environ.get("XGB_MULTI_STRATEGY", "one_output_per_tree")
+
 print("="*70)
 print("TRAINING XGBOOST MODEL")
 print("="*70)
 
 # Load data
 print(f"\n[1/5] Loading engineered data...")
-df = pd.read_csv(DATA_FILE)
-print(f"✅ Loaded {len(df)} samples with {df.shape[1]-1} features")
-
-# Prepare data
-X = df.drop('guard_label', axis=1)
-y = df['guard_label']
+X_train, X_val, X_test, y_train, y_val, y_test, feature_names = load_splits()
+y_all = pd.Series(np.concatenate([y_train, y_val, y_test]))
+num_classes = y_all.nunique()
+print(f"✅ Loaded {len(y_all)} samples with {len(feature_names)} features")
 
-print(f"   Features: {X.shape[1]}")
-print(f"   Classes: {y.nunique()}")
-print(f"   Class distribution: {y.value_counts().describe()}")
+print(f"   Features: {len(feature_names)}")
+print(f"   Classes: {num_classes}")
+print(f"   Class distribution: {y_all.value_counts().describe()}")
 
 # Split data
 print(f"\n[2/5] Splitting data (70% train, 15% val, 15% test)...")
-X_temp, X_test, y_temp, y_test = train_test_split(X, y, test_size=0.15, random_state=42, stratify=y)
-X_train, X_val, y_train, y_val = train_test_split(X_temp, y_temp, test_size=0.1765, random_state=42, stratify=y_temp)
-
+# Split indices are computed once by 02_engineer_features.py
 print(f"   Train: {len(X_train)} samples")
 print(f"   Val: {len(X_val)} samples")
 print(f"   Test: {len(X_test)} samples")
 
 # Create DMatrix
-print(f"\n[3/5] Creating DMatrix...")
-dtrain = xgb.DMatrix(X_train, label=y_train, feature_names=X.columns.tolist())
-dval = xgb.DMatrix(X_val, label=y_val, feature_names=X.columns.tolist())
-dtest = xgb.DMatrix(X_test, label=y_test, feature_names=X.columns.tolist())
+print(f"\n[3/5] Creating QuantileDMatrix...")
+# The cached splits are contiguous float32, XGBoost's native layout, so no
+# conversion copy. QuantileDMatrix bins straight into the hist layout;
+# val/test reuse the training quantile cuts via ref
+dtrain = xgb.QuantileDMatrix(X_train, label=y_train, feature_names=feature_names)
+dval = xgb.QuantileDMatrix(X_val, label=y_val, feature_names=feature_names, ref=dtrain)
+dtest = xgb.QuantileDMatrix(X_test, label=y_test, feature_names=feature_names, ref=dtrain)
 
 # XGBoost parameters
 params = {
     'objective': 'multi:softprob',
-    'num_class': y.nunique(),
+    'num_class': num_classes,
     'max_depth': 10,
     'learning_rate': 0.1,
     'subsample': 0.8,
@@ -62,7 +69,8 @@ params = {
     'reg_lambda': 1,
     'eval_metric': 'mlogloss',
     'tree_method': 'hist',
-    'predictor': 'cpu_predictor',
+    'multi_strategy': MULTI_STRATEGY,
+    'device': TRAIN_DEVICE,
     'random_state': 42
 }
 
@@ -88,28 +96,22 @@ print(f"\n✅ Training completed in {training_time:.2f} seconds")
 # Evaluate
 print(f"\n[5/5] Evaluating model...")
 
-def compute_top_k_accuracy(y_true, y_pred_proba, k=5):
-    """Compute Top-K accuracy"""
-    top_k_preds = np.argsort(y_pred_proba, axis=1)[:, -k:]
-    correct = sum([y_true.iloc[i] in top_k_preds[i] for i in range(len(y_true))])
-    return correct / len(y_true)
-
 # Predictions
 y_pred_proba = model.predict(dtest)
-y_pred = np.argmax(y_pred_proba, axis=1)
+top_k_accuracy = compute_top_k_accuracies(y_test, y_pred_proba)
 
 # Metrics
 metrics = {
-    'top_1_accuracy': float(accuracy_score(y_test, y_pred)),
-    'top_3_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=3)),
-    'top_5_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=5)),
-    'top_10_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=10)),
-    'top_20_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=20)),
+    'top_1_accuracy': top_k_accuracy[1],
+    'top_3_accuracy': top_k_accuracy[3],
+    'top_5_accuracy': top_k_accuracy[5],
+    'top_10_accuracy': top_k_accuracy[10],
+    'top_20_accuracy': top_k_accuracy[20],
     'training_time_seconds': training_time,
     'num_samples_train': len(X_train),
     'num_samples_test': len(X_test),
-    'num_features': X.shape[1],
-    'num_classes': y.nunique()
+    'num_features': len(feature_names),
+    'num_classes': num_classes
 }
 
 print(f"\n📊 XGBOOST MODEL PERFORMANCE:")
@@ -130,11 +132,16 @@ with open(metrics_file, 'w') as f:
     json.dump(metrics, f, indent=2)
 print(f"✅ Metrics saved: {metrics_file}")
 
+# Test-set probabilities for 06_create_ensemble.py, which combines them without re-predicting
+proba_file = MODEL_DIR / "xgboost_v1_test_proba.npy"
+np.save(proba_file, np.asarray(y_pred_proba, dtype=np.float32))
+print(f"✅ Test probabilities saved: {proba_file}")
+
 # Feature importance
 importance = model.get_score(importance_type='gain')
 feature_importance = pd.DataFrame([
     {'feature': f, 'importance': importance.get(f, 0)} 
-    for f in X.columns
+    for f in feature_names
 ]).sort_values('importance', ascending=False)
 
 importance_file = MODEL_DIR / "xgboost_v1_feature_importance.csv"
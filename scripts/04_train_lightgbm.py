@@ -2,45 +2,41 @@
 LightGBM Model Training
 """
 
-import pandas as pd
 import numpy as np
 import lightgbm as lgb
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-import joblib
 import json
+import os
 import time
 from pathlib import Path
 
+from _common import compute_top_k_accuracies, load_splits
+
 # Paths
-DATA_FILE = Path("data/processed/circuits_engineered_75_features.csv")
 MODEL_DIR = Path("models/lightgbm")
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
+# Training device: "cpu" (default) or "cuda" for GPU training
+TRAIN_DEVICE = os.environ.get("TRAIN_DEVICE", "cpu")
+
 print("="*70)
 print("TRAINING LIGHTGBM MODEL")
 print("="*70)
 
 # Load data
 print(f"\n[1/5] Loading engineered data...")
-df = pd.read_csv(DATA_FILE)
-print(f"✅ Loaded {len(df)} samples")
-
-# Prepare data
-X = df.drop('guard_label', axis=1)
-y = df['guard_label']
+X_train, X_val, X_test, y_train, y_val, y_test, feature_names = load_splits()
+num_classes = len(np.unique(np.concatenate([y_train, y_val, y_test])))
+print(f"✅ Loaded {len(y_train) + len(y_val) + len(y_test)} samples")
 
 # Split data
 print(f"\n[2/5] Splitting data...")
-X_temp, X_test, y_temp, y_test = train_test_split(X, y, test_size=0.15, random_state=42, stratify=y)
-X_train, X_val, y_train, y_val = train_test_split(X_temp, y_temp, test_size=0.1765, random_state=42, stratify=y_temp)
-
+# Split indices are computed once by 02_engineer_features.py
 print(f"   Train: {len(X_train)}, Val: {len(X_val)}, Test: {len(X_test)}")
 
 # LightGBM parameters
 params = {
     'objective': 'multiclass',
-    'num_class': y.nunique(),
+    'num_class': num_classes,
     'metric': 'multi_logloss',
     'boosting_type': 'gbdt',
     'num_leaves': 255,
@@ -51,6 +47,9 @@ params = {
     'verbose': 0,
     'random_state': 42
 }
+if TRAIN_DEVICE == "cuda":
+    # LightGBM's GPU histogram builder; single precision is enough for binned features
+    params.update({'device': 'gpu', 'gpu_use_dp': False})
 
 print(f"\n[3/5] Training LightGBM model...")
 print(f"   Parameters: {params}")
@@ -63,6 +62,7 @@ model.fit(
     X_train, y_train,
     eval_set=[(X_val, y_val)],
     eval_metric='multi_logloss',
+    feature_name=feature_names,
     callbacks=[lgb.early_stopping(20), lgb.log_evaluation(10)]
 )
 
@@ -72,25 +72,20 @@ print(f"\n✅ Training completed in {training_time:.2f} seconds")
 # Evaluate
 print(f"\n[4/5] Evaluating model...")
 
-def compute_top_k_accuracy(y_true, y_pred_proba, k=5):
-    top_k_preds = np.argsort(y_pred_proba, axis=1)[:, -k:]
-    correct = sum([y_true.iloc[i] in top_k_preds[i] for i in range(len(y_true))])
-    return correct / len(y_true)
-
 y_pred_proba = model.predict_proba(X_test)
-y_pred = np.argmax(y_pred_proba, axis=1)
+top_k_accuracy = compute_top_k_accuracies(y_test, y_pred_proba)
 
 metrics = {
-    'top_1_accuracy': float(accuracy_score(y_test, y_pred)),
-    'top_3_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=3)),
-    'top_5_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=5)),
-    'top_10_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=10)),
-    'top_20_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=20)),
+    'top_1_accuracy': top_k_accuracy[1],
+    'top_3_accuracy': top_k_accuracy[3],
+    'top_5_accuracy': top_k_accuracy[5],
+    'top_10_accuracy': top_k_accuracy[10],
+    'top_20_accuracy': top_k_accuracy[20],
     'training_time_seconds': training_time,
     'num_samples_train': len(X_train),
     'num_samples_test': len(X_test),
-    'num_features': X.shape[1],
-    'num_classes': y.nunique()
+    'num_features': len(feature_names),
+    'num_classes': num_classes
 }
 
 print(f"\n📊 LIGHTGBM MODEL PERFORMANCE:")
@@ -100,8 +95,9 @@ print(f"   Top-10 Accuracy: {metrics['top_10_accuracy']*100:.2f}%")
 
 # Save model
 print(f"\n[5/5] Saving model...")
-model_file = MODEL_DIR / "lightgbm_v1.pkl"
-joblib.dump(model, model_file)
+# Native text format loads straight into a Booster, without the sklearn wrapper
+model_file = MODEL_DIR / "lightgbm_v1.txt"
+model.booster_.save_model(str(model_file))
 print(f"✅ Model saved: {model_file}")
 
 metrics_file = MODEL_DIR / "lightgbm_v1_metrics.json"
@@ -109,6 +105,11 @@ with open(metrics_file, 'w') as f:
     json.dump(metrics, f, indent=2)
 print(f"✅ Metrics saved: {metrics_file}")
 
+# Test-set probabilities for 06_create_ensemble.py, which combines them without re-predicting
+proba_file = MODEL_DIR / "lightgbm_v1_test_proba.npy"
+np.save(proba_file, np.asarray(y_pred_proba, dtype=np.float32))
+print(f"✅ Test probabilities saved: {proba_file}")
+
 print("\n" + "="*70)
 print("✅ LIGHTGBM TRAINING COMPLETE!")
 print("="*70)
@@ -2,17 +2,15 @@
 CatBoost Model Training (Memory-Optimized)
 """
 
-import pandas as pd
 import numpy as np
-from catboost import CatBoostClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
+from catboost import CatBoostClassifier, Pool
 import json
 import time
 from pathlib import Path
 
+from _common import compute_top_k_accuracies, load_splits
+
 # Paths
-DATA_FILE = Path("data/processed/circuits_engineered_75_features.csv")
 MODEL_DIR = Path("models/catboost")
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -22,20 +20,19 @@ print("="*70)
 
 # Load data
 print(f"\n[1/5] Loading engineered data...")
-df = pd.read_csv(DATA_FILE)
-print(f"✅ Loaded {len(df)} samples")
-
-# Prepare data
-X = df.drop('guard_label', axis=1)
-y = df['guard_label']
+X_train, X_val, X_test, y_train, y_val, y_test, feature_names = load_splits()
+num_classes = len(np.unique(np.concatenate([y_train, y_val, y_test])))
+print(f"✅ Loaded {len(y_train) + len(y_val) + len(y_test)} samples")
 
 # Split data
 print(f"\n[2/5] Splitting data...")
-X_temp, X_test, y_temp, y_test = train_test_split(X, y, test_size=0.15, random_state=42, stratify=y)
-X_train, X_val, y_train, y_val = train_test_split(X_temp, y_temp, test_size=0.1765, random_state=42, stratify=y_temp)
-
+# Split indices are computed once by 02_engineer_features.py
 print(f"   Train: {len(X_train)}, Val: {len(X_val)}, Test: {len(X_test)}")
 
+# float32 Pools built once from the cached splits; both training attempts below share them
+train_pool = Pool(X_train, y_train, feature_names=feature_names)
+val_pool = Pool(X_val, y_val, feature_names=feature_names)
+
 # REDUCED CatBoost parameters to prevent memory issues
 params = {
     'iterations': 100,          # Reduced from 300
@@ -43,6 +40,7 @@ params = {
     'learning_rate': 0.1,
     'loss_function': 'MultiClass',
     'eval_metric': 'MultiClass',
+    'boosting_type': 'Plain',   # Ordered boosting keeps extra per-permutation state
     'random_seed': 42,
     'verbose': 20,              # Show progress every 20 iterations
     'early_stopping_rounds': 15,
@@ -62,8 +60,8 @@ start_time = time.time()
 try:
     model = CatBoostClassifier(**params)
     model.fit(
-        X_train, y_train,
-        eval_set=(X_val, y_val),
+        train_pool,
+        eval_set=val_pool,
         use_best_model=True,
         verbose=20
     )
@@ -82,6 +80,7 @@ except Exception as e:
         'depth': 4,
         'learning_rate': 0.15,
         'loss_function': 'MultiClass',
+        'boosting_type': 'Plain',
         'random_seed': 42,
         'verbose': 10,
         'task_type': 'CPU',
@@ -90,32 +89,27 @@ except Exception as e:
     
     start_time = time.time()
     model = CatBoostClassifier(**params_minimal)
-    model.fit(X_train, y_train, verbose=10)
+    model.fit(train_pool, verbose=10)
     training_time = time.time() - start_time
     print(f"\n✅ Training completed with minimal params in {training_time:.2f} seconds")
 
 # Evaluate
 print(f"\n[4/5] Evaluating model...")
 
-def compute_top_k_accuracy(y_true, y_pred_proba, k=5):
-    top_k_preds = np.argsort(y_pred_proba, axis=1)[:, -k:]
-    correct = sum([y_true.iloc[i] in top_k_preds[i] for i in range(len(y_true))])
-    return correct / len(y_true)
-
 y_pred_proba = model.predict_proba(X_test)
-y_pred = np.argmax(y_pred_proba, axis=1)
+top_k_accuracy = compute_top_k_accuracies(y_test, y_pred_proba)
 
 metrics = {
-    'top_1_accuracy': float(accuracy_score(y_test, y_pred)),
-    'top_3_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=3)),
-    'top_5_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=5)),
-    'top_10_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=10)),
-    'top_20_accuracy': float(compute_top_k_accuracy(y_test, y_pred_proba, k=20)),
+    'top_1_accuracy': top_k_accuracy[1],
+    'top_3_accuracy': top_k_accuracy[3],
+    'top_5_accuracy': top_k_accuracy[5],
+    'top_10_accuracy': top_k_accuracy[10],
+    'top_20_accuracy': top_k_accuracy[20],
     'training_time_seconds': training_time,
     'num_samples_train': len(X_train),
     'num_samples_test': len(X_test),
-    'num_features': X.shape[1],
-    'num_classes': y.nunique()
+    'num_features': len(feature_names),
+    'num_classes': num_classes
 }
 
 print(f"\n📊 CATBOOST MODEL PERFORMANCE:")
@@ -134,6 +128,11 @@ with open(metrics_file, 'w') as f:
     json.dump(metrics, f, indent=2)
 print(f"✅ Metrics saved: {metrics_file}")
 
+# Test-set probabilities for 06_create_ensemble.py, which combines them without re-predicting
+proba_file = MODEL_DIR / "catboost_v1_test_proba.npy"
+np.save(proba_file, np.asarray(y_pred_proba, dtype=np.float32))
+print(f"✅ Test probabilities saved: {proba_file}")
+
 print("\n" + "="*70)
 print("✅ CATBOOST TRAINING COMPLETE!")
 print("="*70)
@@ -3,23 +3,21 @@ Ensemble Model Creation
 Combines XGBoost, LightGBM, CatBoost predictions
 """
 
-import pandas as pd
 import numpy as np
-import xgboost as xgb
-import lightgbm as lgb
-from catboost import CatBoostClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
 import joblib
 import json
-import time
 from pathlib import Path
 
+from _common import compute_top_k_accuracies, load_splits
+
 # Paths
-DATA_FILE = Path("data/processed/circuits_engineered_75_features.csv")
 XGBOOST_MODEL = Path("models/xgboost/xgboost_v1.json")
-LIGHTGBM_MODEL = Path("models/lightgbm/lightgbm_v1.pkl")
+LIGHTGBM_MODEL = Path("models/lightgbm/lightgbm_v1.txt")
 CATBOOST_MODEL = Path("models/catboost/catboost_v1.cbm")
+# Test-set probabilities written by the training scripts 03/04/05
+XGBOOST_TEST_PROBA = Path("models/xgboost/xgboost_v1_test_proba.npy")
+LIGHTGBM_TEST_PROBA = Path("models/lightgbm/lightgbm_v1_test_proba.npy")
+CATBOOST_TEST_PROBA = Path("models/catboost/catboost_v1_test_proba.npy")
 ENSEMBLE_DIR = Path("models/ensemble")
 ENSEMBLE_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -29,44 +27,27 @@ print("="*70)
 
 # Load data
 print(f"\n[1/5] Loading data...")
-df = pd.read_csv(DATA_FILE)
-X = df.drop('guard_label', axis=1)
-y = df['guard_label']
-
-X_temp, X_test, y_temp, y_test = train_test_split(X, y, test_size=0.15, random_state=42, stratify=y)
-
-# Load all three models
-print(f"\n[2/5] Loading all trained models...")
+# Only the test labels are needed; the probabilities come precomputed from training.
+# Same test split as the training scripts (computed by 02_engineer_features.py)
+y_test = load_splits()[5]
 
-# XGBoost
-xgb_model = xgb.Booster()
-xgb_model.load_model(str(XGBOOST_MODEL))
-print(f"   ✅ XGBoost loaded")
+# Load the test-set predictions saved by each training script
+print(f"\n[2/5] Loading saved test predictions...")
 
-# LightGBM
-lgb_model = joblib.load(LIGHTGBM_MODEL)
-print(f"   ✅ LightGBM loaded")
+xgb_proba = np.load(XGBOOST_TEST_PROBA)
+print(f"   ✅ XGBoost predictions loaded")
 
-# CatBoost
-cat_model = CatBoostClassifier()
-cat_model.load_model(str(CATBOOST_MODEL))
-print(f"   ✅ CatBoost loaded")
+lgb_proba = np.load(LIGHTGBM_TEST_PROBA)
+print(f"   ✅ LightGBM predictions loaded")
 
-# Generate predictions from each model
-print(f"\n[3/5] Generating predictions from all models...")
+cat_proba = np.load(CATBOOST_TEST_PROBA)
+print(f"   ✅ CatBoost predictions loaded")
 
-# XGBoost predictions
-dtest = xgb.DMatrix(X_test, feature_names=X.columns.tolist())
-xgb_proba = xgb_model.predict(dtest)
-print(f"   ✅ XGBoost predictions generated")
-
-# LightGBM predictions
-lgb_proba = lgb_model.predict_proba(X_test)
-print(f"   ✅ LightGBM predictions generated")
-
-# CatBoost predictions
-cat_proba = cat_model.predict_proba(X_test)
-print(f"   ✅ CatBoost predictions generated")
+print(f"\n[3/5] Checking prediction shapes...")
+for name, proba in [('XGBoost', xgb_proba), ('LightGBM', lgb_proba), ('CatBoost', cat_proba)]:
+    if proba.shape[0] != len(y_test):
+        raise ValueError(f"{name} test probabilities have {proba.shape[0]} rows, expected {len(y_test)}; retrain it")
+print(f"   ✅ All predictions cover {len(y_test)} test samples")
 
 # Combine predictions with weighted average
 print(f"\n[4/5] Combining predictions (weighted ensemble)...")
@@ -76,31 +57,26 @@ weights = {
     'catboost': 0.3
 }
 
-ensemble_proba = (
-    weights['xgboost'] * xgb_proba +
-    weights['lightgbm'] * lgb_proba +
-    weights['catboost'] * cat_proba
-)
+# Accumulate in place so only one extra (N, num_classes) array is allocated;
+# the component arrays are scaled in place since they are not needed afterwards
+ensemble_proba = np.multiply(xgb_proba, weights['xgboost'], dtype=np.float64)
+ensemble_proba += np.multiply(lgb_proba, weights['lightgbm'], out=lgb_proba)
+ensemble_proba += np.multiply(cat_proba, weights['catboost'], out=cat_proba)
 
 print(f"   Ensemble weights: XGBoost={weights['xgboost']}, LightGBM={weights['lightgbm']}, CatBoost={weights['catboost']}")
 
 # Evaluate ensemble
 print(f"\n[5/5] Evaluating ensemble performance...")
 
-def compute_top_k_accuracy(y_true, y_pred_proba, k=5):
-    top_k_preds = np.argsort(y_pred_proba, axis=1)[:, -k:]
-    correct = sum([y_true.iloc[i] in top_k_preds[i] for i in range(len(y_true))])
-    return correct / len(y_true)
-
-y_pred = np.argmax(ensemble_proba, axis=1)
+top_k_accuracy = compute_top_k_accuracies(y_test, ensemble_proba)
 
 metrics = {
-    'top_1_accuracy': float(accuracy_score(y_test, y_pred)),
-    'top_3_accuracy': float(compute_top_k_accuracy(y_test, ensemble_proba, k=3)),
-    'top_5_accuracy': float(compute_top_k_accuracy(y_test, ensemble_proba, k=5)),
-    'top_10_accuracy': float(compute_top_k_accuracy(y_test, ensemble_proba, k=10)),
-    'top_20_accuracy': float(compute_top_k_accuracy(y_test, ensemble_proba, k=20)),
-    'num_samples_test': len(X_test),
+    'top_1_accuracy': top_k_accuracy[1],
+    'top_3_accuracy': top_k_accuracy[3],
+    'top_5_accuracy': top_k_accuracy[5],
+    'top_10_accuracy': top_k_accuracy[10],
+    'top_20_accuracy': top_k_accuracy[20],
+    'num_samples_test': len(y_test),
     'ensemble_components': ['xgboost', 'lightgbm', 'catboost'],
     'ensemble_weights': weights
 }
@@ -6,12 +6,11 @@ Simplified for 500-class problem
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-import shap
-import joblib
+import json
 from pathlib import Path
 
 # Paths
-DATA_FILE = Path("data/processed/circuits_engineered_75_features.csv")
+DATA_FILE = Path("data/processed/circuits_engineered_75_features.parquet")
 XGBOOST_MODEL = Path("models/xgboost/xgboost_v1.json")
 SHAP_DIR = Path("models/shap")
 SHAP_DIR.mkdir(parents=True, exist_ok=True)
@@ -22,7 +21,7 @@ print("="*70)
 
 # Load data (use MUCH smaller sample)
 print(f"\n[1/5] Loading data...")
-df = pd.read_csv(DATA_FILE)
+df = pd.read_parquet(DATA_FILE, engine="pyarrow")
 X = df.drop('guard_label', axis=1)
 
 # Use only 100 samples instead of 1000 to save memory
@@ -35,23 +34,17 @@ model = xgb.Booster()
 model.load_model(str(XGBOOST_MODEL))
 print(f"✅ Model loaded")
 
-# Create SHAP explainer
-print(f"\n[3/5] Creating SHAP TreeExplainer...")
-try:
-    explainer = shap.TreeExplainer(model)
-    print(f"✅ SHAP explainer created")
-except Exception as e:
-    print(f"⚠️ TreeExplainer creation note: {e}")
-    print(f"   Continuing anyway...")
-    explainer = shap.TreeExplainer(model)
+# XGBoost computes TreeSHAP natively via pred_contribs, so no shap.TreeExplainer
+# (and no per-class list of arrays) is needed here
+print(f"\n[3/5] Preparing single-sample input...")
+X_single = X_sample.iloc[:1]
+dmatrix_single = xgb.DMatrix(X_single, feature_names=X.columns.tolist())
+print(f"✅ Sample DMatrix ready")
 
 # Pre-compute SHAP values for a SINGLE sample (to avoid memory issues)
 print(f"\n[4/5] Computing sample SHAP values (single prediction)...")
+contribs = None
 try:
-    # Use only 1 sample to demonstrate
-    X_single = X_sample.iloc[:1]
-    dmatrix_single = xgb.DMatrix(X_single, feature_names=X.columns.tolist())
-    
     # Get prediction first
     pred = model.predict(dmatrix_single)[0]
     top_class = np.argmax(pred)
@@ -59,16 +52,10 @@ try:
     print(f"   Sample prediction: Top class = {top_class}")
     print(f"   Computing SHAP values for demonstration...")
     
-    # Compute SHAP values (this returns values for ALL classes)
-    shap_values = explainer.shap_values(dmatrix_single)
-    
-    # If it's a list (one array per class), extract just top class
-    if isinstance(shap_values, list):
-        shap_values_top = shap_values[top_class]
-        print(f"   ✅ SHAP values computed for class {top_class}")
-    else:
-        shap_values_top = shap_values
-        print(f"   ✅ SHAP values computed")
+    # Shape (n_samples, n_classes, n_features + 1); the last column is the bias term
+    contribs = model.predict(dmatrix_single, pred_contribs=True)
+    shap_values_top = contribs[:, top_class, :-1]
+    print(f"   ✅ SHAP values computed for class {top_class}")
     
     # Save only the single-sample SHAP values
     np.save(SHAP_DIR / "shap_sample_values.npy", shap_values_top[:10])  # Save only 10 samples
@@ -79,25 +66,13 @@ except Exception as e:
     print(f"   Note: {e}")
     print(f"   This is OK - explainer still works for on-demand computation")
 
-# Save explainer
-print(f"\n[5/5] Saving SHAP explainer...")
-explainer_file = SHAP_DIR / "shap_explainer_xgboost.pkl"
-try:
-    joblib.dump(explainer, explainer_file, compress=3)
-    print(f"✅ SHAP explainer saved: {explainer_file}")
-except Exception as e:
-    print(f"⚠️ Explainer save issue: {e}")
-    # Try without compression
-    joblib.dump(explainer, explainer_file)
-    print(f"✅ SHAP explainer saved (uncompressed): {explainer_file}")
+# The explainer itself is not persisted: TreeExplainer is rebuilt cheaply from
+# the model file, so only base values and metadata are saved
+print(f"\n[5/5] Saving SHAP base values and metadata...")
 
-# Save base values (expected value)
-if hasattr(explainer, 'expected_value'):
-    if isinstance(explainer.expected_value, (list, np.ndarray)):
-        base_val = explainer.expected_value[0] if len(explainer.expected_value) > 0 else 0
-    else:
-        base_val = explainer.expected_value
-    
+# Save base values (expected value): the bias column of the first class
+if contribs is not None:
+    base_val = contribs[0, 0, -1]
     np.save(SHAP_DIR / "shap_base_values.npy", base_val)
     print(f"✅ Base values saved")
 
@@ -105,13 +80,13 @@ if hasattr(explainer, 'expected_value'):
 metadata = {
     "note": "SHAP explainer for on-demand computation",
     "model_type": "XGBoost Booster",
+    "model_path": str(XGBOOST_MODEL),
     "num_features": len(X.columns),
     "num_classes": 500,
     "memory_optimized": True,
-    "usage": "Use explainer.shap_values() on small batches only"
+    "usage": "Build shap.TreeExplainer from model_path; use shap_values() on small batches only"
 }
 
-import json
 with open(SHAP_DIR / "shap_metadata.json", 'w') as f:
     json.dump(metadata, f, indent=2)
 print(f"✅ Metadata saved")
@@ -0,0 +1,67 @@
+"""
+Shared helpers for the training scripts
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Outputs of 02_engineer_features.py
+DATA_FILE = Path("data/processed/circuits_engineered_75_features.parquet")
+SPLITS_FILE = Path("data/processed/splits.npz")
+# float32/int32 .npy copies of each split, memory-mapped by load_splits()
+SPLITS_CACHE_DIR = Path("data/processed/splits_npz")
+SPLIT_ARRAYS = ('X_train', 'X_val', 'X_test', 'y_train', 'y_val', 'y_test')
+
+
+def load_splits():
+    """
+    Load the train/val/test split shared by scripts 03-06
+    
+    Returns:
+        (X_train, X_val, X_test, y_train, y_val, y_test, feature_names) with
+        read-only memory-mapped float32 features and int32 labels. The .npy
+        cache is rebuilt whenever the engineered data or split is newer.
+    """
+    names_file = SPLITS_CACHE_DIR / "feature_names.json"
+    source_mtime = max(DATA_FILE.stat().st_mtime, SPLITS_FILE.stat().st_mtime)
+    if not names_file.exists() or names_file.stat().st_mtime < source_mtime:
+        _build_split_cache(names_file)
+    
+    arrays = [np.load(SPLITS_CACHE_DIR / f"{name}.npy", mmap_mode='r') for name in SPLIT_ARRAYS]
+    with open(names_file, 'r') as f:
+        feature_names = json.load(f)
+    return (*arrays, feature_names)
+
+
+def _build_split_cache(names_file):
+    """Write each split as a contiguous .npy array; feature names go last to mark completion"""
+    print(f"   Building split cache in {SPLITS_CACHE_DIR}...")
+    SPLITS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    df = pd.read_parquet(DATA_FILE, engine="pyarrow")
+    X = df.drop('guard_label', axis=1)
+    features = X.to_numpy(dtype=np.float32)
+    labels = df['guard_label'].to_numpy(dtype=np.int32)
+    
+    splits = np.load(SPLITS_FILE)
+    for split in ('train', 'val', 'test'):
+        np.save(SPLITS_CACHE_DIR / f"X_{split}.npy", features[splits[split]])
+        np.save(SPLITS_CACHE_DIR / f"y_{split}.npy", labels[splits[split]])
+    
+    with open(names_file, 'w') as f:
+        json.dump(X.columns.tolist(), f)
+
+
+def compute_top_k_accuracies(y_true, y_pred_proba, ks=(1, 3, 5, 10, 20)):
+    """Compute Top-K accuracy for every k in ks from a single partition pass"""
+    y = np.asarray(y_true)
+    k_max = max(ks)
+    
+    # Keep the k_max best classes per row, then order only those
+    top = np.argpartition(y_pred_proba, -k_max, axis=1)[:, -k_max:]
+    order = np.argsort(-np.take_along_axis(y_pred_proba, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    
+    hits = top == y[:, None]
+    return {k: float(hits[:, :k].any(axis=1).mean()) for k in ks}
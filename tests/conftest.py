@@ -0,0 +1,61 @@
+"""
+Shared fixtures: a registry of tiny XGBoost/LightGBM/CatBoost models
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import xgboost as xgb
+import lightgbm as lgb
+from catboost import CatBoostClassifier
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.config import NUM_FEATURES
+from backend.core.feature_engineering import INPUT_FEATURES
+from backend.core.model_loader import ModelRegistry
+
+NUM_CLASSES = 5
+
+
+@pytest.fixture(scope="session")
+def registry(tmp_path_factory):
+    """ModelRegistry holding small models trained on random data"""
+    feature_names = tuple(INPUT_FEATURES) + tuple(
+        f'dummy_feature_{i}' for i in range(len(INPUT_FEATURES), NUM_FEATURES)
+    )
+    rng = np.random.default_rng(0)
+    X = rng.random((200, NUM_FEATURES), dtype=np.float32)
+    y = np.arange(200) % NUM_CLASSES
+    
+    xgb_model = xgb.train(
+        {'objective': 'multi:softprob', 'num_class': NUM_CLASSES, 'max_depth': 2},
+        xgb.DMatrix(X, label=y, feature_names=list(feature_names)),
+        num_boost_round=3
+    )
+    lgb_model = lgb.LGBMClassifier(n_estimators=3, num_leaves=4, verbose=-1)
+    lgb_model.fit(X, y, feature_name=list(feature_names))
+    cat_model = CatBoostClassifier(iterations=3, depth=2, loss_function='MultiClass',
+                                   verbose=0, allow_writing_files=False)
+    cat_model.fit(X, y)
+    # Round-trip through .cbm like the registry's loader does
+    cat_file = tmp_path_factory.mktemp("catboost") / "catboost.cbm"
+    cat_model.save_model(str(cat_file))
+    cat_model = CatBoostClassifier()
+    cat_model.load_model(str(cat_file))
+    
+    reg = ModelRegistry()
+    reg.models = {
+        'xgboost': xgb_model,
+        'lightgbm': lgb_model.booster_,
+        'catboost': cat_model,
+        'ensemble': {'weights': {'xgboost': 0.4, 'lightgbm': 0.3, 'catboost': 0.3}},
+    }
+    reg.feature_names = feature_names
+    reg.feature_index = {name: i for i, name in enumerate(feature_names)}
+    reg.encoders = {}
+    reg.num_classes = NUM_CLASSES
+    return reg
@@ -0,0 +1,29 @@
+"""
+Tests for CounterfactualService
+"""
+
+import pytest
+
+from backend.core.counterfactual_service import CounterfactualService
+from backend.core.feature_engineering import FeatureEngineer
+from backend.core.prediction_service import PredictionService
+
+
+@pytest.mark.parametrize("model_name", ["catboost", "ensemble"])
+def test_analyze_counterfactual_repeated_calls(registry, model_name):
+    """CatBoost marks its input read-only; later calls must still build features"""
+    feature_engineer = FeatureEngineer(
+        encoders=registry.encoders,
+        feature_names=registry.feature_names,
+        feature_index=registry.feature_index
+    )
+    service = CounterfactualService(
+        prediction_service=PredictionService(registry, feature_engineer),
+        feature_engineer=feature_engineer
+    )
+    original_input = {'exit_country': 'DE', 'bandwidth': 7.5, 'timestamp': '2025-11-20T22:19:59'}
+    
+    for _ in range(2):
+        result = service.analyze_counterfactual(original_input, {'bandwidth': 12.0}, model_name=model_name)
+        assert result['success']
+        assert len(result['original']['predictions']) == len(result['modified']['predictions'])
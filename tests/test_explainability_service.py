@@ -0,0 +1,24 @@
+"""
+Tests for ExplainabilityService
+"""
+
+import pytest
+
+from backend.core.explainability_service import ExplainabilityService
+from backend.core.feature_engineering import FeatureEngineer
+
+
+@pytest.mark.parametrize("model_name", [
+    "lightgbm",  # Booster: no feature_importances_ or get_score
+    "catboost",  # loaded .cbm models report feature_importances_ as a 0-d None array
+])
+def test_feature_importance_is_nonzero(registry, model_name):
+    feature_engineer = FeatureEngineer(
+        encoders=registry.encoders,
+        feature_names=registry.feature_names,
+        feature_index=registry.feature_index
+    )
+    service = ExplainabilityService(model_registry=registry, feature_engineer=feature_engineer)
+    
+    importance = service.get_feature_importance(model_name)
+    assert sum(item['importance'] for item in importance) > 0
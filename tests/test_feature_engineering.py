@@ -0,0 +1,33 @@
+"""
+Tests for FeatureEngineer
+"""
+
+from backend.core.feature_engineering import DEFAULT_COUNTRY_CODES, FeatureEngineer
+
+
+def test_missing_encoders_fall_back_to_default_country_codes(registry):
+    """Encoders that failed to load (None) must not break construction"""
+    feature_engineer = FeatureEngineer(
+        encoders=None,
+        feature_names=registry.feature_names,
+        feature_index=registry.feature_index
+    )
+    assert feature_engineer.encoders == {}
+    
+    features = feature_engineer.engineer_from_input({'exit_country': 'US'})
+    assert features.shape == (1, len(registry.feature_names))
+    assert features[0, registry.feature_index['exit_country_encoded']] == DEFAULT_COUNTRY_CODES['US']
+
+
+def test_feature_buffer_reused_after_catboost_prediction(registry):
+    """The per-thread buffer stays writable once CatBoost has predicted on it"""
+    feature_engineer = FeatureEngineer(
+        encoders=registry.encoders,
+        feature_names=registry.feature_names,
+        feature_index=registry.feature_index
+    )
+    features = feature_engineer.engineer_from_input({'exit_country': 'DE'})
+    registry.predict_proba('catboost', features)
+    
+    assert feature_engineer.engineer_from_input({'exit_country': 'US'}) is features
+    assert features.flags.writeable
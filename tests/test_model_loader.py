@@ -0,0 +1,70 @@
+"""
+Tests for ModelRegistry
+"""
+
+import pytest
+
+from backend.core import model_loader
+from backend.core.model_loader import ModelRegistry
+
+
+class _FakeExplainer:
+    """Stands in for shap.TreeExplainer, remembering the model it was built for"""
+    
+    def __init__(self, model, **kwargs):
+        self.model = model
+
+
+def _registry_with_models(registry):
+    """Fresh registry sharing the fixture's models, with no explainer built yet"""
+    reg = ModelRegistry()
+    reg.models = dict(registry.models)
+    return reg
+
+
+def test_shap_explainer_built_once(registry, monkeypatch):
+    calls = []
+    
+    def counting_explainer(model, **kwargs):
+        calls.append(model)
+        return _FakeExplainer(model)
+    
+    monkeypatch.setattr(model_loader.shap, 'TreeExplainer', counting_explainer)
+    reg = _registry_with_models(registry)
+    
+    first = reg.get_shap_explainer()
+    assert reg.get_shap_explainer() is first
+    assert len(calls) == 1
+
+
+def test_shap_explainer_is_keyed_by_model(registry, monkeypatch):
+    """An explainer built for one model is never returned for another"""
+    monkeypatch.setattr(model_loader.shap, 'TreeExplainer', _FakeExplainer)
+    reg = _registry_with_models(registry)
+    
+    lgb_explainer = reg.get_shap_explainer('lightgbm')
+    xgb_explainer = reg.get_shap_explainer('xgboost')
+    assert lgb_explainer.model is registry.models['lightgbm']
+    assert xgb_explainer.model is registry.models['xgboost']
+
+
+def test_shap_explainer_failure_is_not_retried(registry, monkeypatch):
+    calls = []
+    
+    def failing_for_catboost(model, **kwargs):
+        calls.append(model)
+        if model is registry.models['catboost']:
+            raise MemoryError("Unable to allocate 6.00 GiB")
+        return _FakeExplainer(model)
+    
+    monkeypatch.setattr(model_loader.shap, 'TreeExplainer', failing_for_catboost)
+    reg = _registry_with_models(registry)
+    
+    for _ in range(3):
+        with pytest.raises(RuntimeError, match="SHAP explainer unavailable for catboost"):
+            reg.get_shap_explainer('catboost')
+    assert len(calls) == 1
+    assert 'catboost' in reg.shap_explainer_errors
+    
+    # Other models are unaffected by the cached failure
+    assert reg.get_shap_explainer('xgboost').model is registry.models['xgboost']